@@ -0,0 +1,162 @@
+import hashlib
+from bisect import bisect_left
+import numpy as np
+
+
+class PrefixList():
+    """
+    Sorted keys searched by binary search. Each key has a weight and a
+    display string; the best completions of every short prefix are
+    precomputed so one-letter prefixes don't scan large ranges.
+    """
+
+    def __init__(self, keys, weights, labels, cached_prefix_len=2, cached_k=20):
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.labels = [labels[i] for i in order]
+        self.weights = np.asarray(weights, dtype=np.int64)[order] if len(keys) else np.zeros(0, dtype=np.int64)
+        self.cached_k = cached_k
+        self.cache = {}
+        for n in range(1, cached_prefix_len + 1):
+            for prefix in {key[:n] for key in self.keys if len(key) >= n}:
+                self.cache[prefix] = self._top(prefix, cached_k)
+
+    def _range(self, prefix):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        return lo, hi
+
+    def _top(self, prefix, k):
+        lo, hi = self._range(prefix)
+        weights = self.weights[lo:hi]
+        if hi - lo > k:
+            best = np.argpartition(-weights, k)[:k]
+        else:
+            best = np.arange(hi - lo)
+        best = best[np.argsort(-weights[best], kind="stable")]
+        return (lo + best).tolist()
+
+    def complete(self, prefix, k):
+        cached = self.cache.get(prefix)
+        top = cached if cached is not None and k <= self.cached_k else self._top(prefix, k)
+        return [(self.labels[i], int(self.weights[i])) for i in top[:k]]
+
+
+class PrefixIndex():
+    """
+    Autocomplete over the corpus vocabulary and the paper titles, both
+    weighted by document frequency.
+    """
+
+    def __init__(self):
+        self.terms = None
+        self.titles = None
+        self.n_docs = 0
+        self.fingerprint = ""
+
+    @staticmethod
+    def source_fingerprint(term_df, titles):
+        """
+        SHA-1 of the inputs of build, to tell whether a saved index is stale
+        """
+
+        digest = hashlib.sha1()
+        for term in sorted(term_df):
+            digest.update(f"{term}\t{term_df[term]}\n".encode("utf-8"))
+        for title in titles:
+            digest.update(title.encode("utf-8") + b"\n")
+        return digest.hexdigest()
+
+    def build(self, term_df, titles):
+        """
+        Build the index
+
+        Parameters
+        ----------
+        arg1 : dict
+            Maps each (lowercased) corpus term to its document frequency
+        arg2 : list
+            The paper titles
+        """
+
+        self.n_docs = len(titles)
+        self.fingerprint = self.source_fingerprint(term_df, titles)
+        terms = list(term_df)
+        self.terms = PrefixList(terms, [term_df[t] for t in terms], terms)
+
+        title_df = {}
+        for title in titles:
+            key = normalize(title)
+            if key:
+                label, df = title_df.get(key, (" ".join(title.split()), 0))
+                title_df[key] = (label, df + 1)
+        keys = list(title_df)
+        self.titles = PrefixList(
+            keys, [title_df[key][1] for key in keys], [title_df[key][0] for key in keys]
+        )
+
+    def suggest(self, prefix, k=5):
+        """
+        Completions for a partially typed query
+
+        Parameters
+        ----------
+        arg1 : str
+            The text typed so far
+        arg2 : int
+            The number of suggestions of each kind
+
+        Returns
+        -------
+        dict
+            "queries": the typed text with its last word completed from the
+            vocabulary, and "titles": titles starting with the typed text,
+            both as (suggestion, document frequency) pairs
+        """
+
+        text = normalize(prefix)
+        if not text:
+            return {"queries": [], "titles": []}
+        head, _, last = text.rpartition(" ")
+        if prefix[-1:].isspace():
+            queries = []
+        else:
+            head = head + " " if head else ""
+            queries = [(head + term, df) for term, df in self.terms.complete(last, k)]
+        return {"queries": queries, "titles": self.titles.complete(text, k)}
+
+    def save(self, path):
+        def pack(strings):
+            return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+        np.savez_compressed(
+            path,
+            n_docs=np.array(self.n_docs),
+            fingerprint=np.array(self.fingerprint),
+            term_keys=pack(self.terms.keys),
+            term_weights=self.terms.weights,
+            title_keys=pack(self.titles.keys),
+            title_labels=pack(self.titles.labels),
+            title_weights=self.titles.weights,
+        )
+
+    @classmethod
+    def load(cls, path):
+        def unpack(array):
+            text = array.tobytes().decode("utf-8")
+            return text.split("\n") if text else []
+
+        data = np.load(path)
+        index = cls()
+        index.n_docs = int(data["n_docs"])
+        index.fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+        terms = unpack(data["term_keys"])
+        index.terms = PrefixList(terms, data["term_weights"], terms)
+        index.titles = PrefixList(
+            unpack(data["title_keys"]), data["title_weights"], unpack(data["title_labels"])
+        )
+        return index
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
@@ -0,0 +1,83 @@
+"""
+Import-time benchmark for the Retrieval modules.
+
+Every module is imported in a fresh interpreter (cold start), several
+times, and the median wall time is reported together with the heavy
+libraries the import pulled in. With --baseline REV the same modules are
+also benchmarked from git revision REV for comparison, e.g.
+
+    python Retrieval/benchmarkImports.py --baseline HEAD~1
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+MODULES = [
+    "tokenization", "sentenceSegmentation", "inflectionReduction",
+    "stopwordRemoval", "information_Retrieval_3", "main_3",
+]
+HEAVY = ["torch", "sentence_transformers", "faiss", "gensim", "sklearn"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def timeImport(module, folder, repeats):
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            cwd=folder, capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            return None, out.stderr.strip().splitlines()[-1]
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(r["seconds"] for r in runs), ", ".join(runs[-1]["heavy"]) or "-"
+
+
+def benchmark(folder, repeats):
+    return {m: timeImport(m, folder, repeats) for m in MODULES}
+
+
+def checkout(rev):
+    """
+    Extract Retrieval/ at a git revision into a temporary folder
+    """
+
+    root = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True
+    ).stdout.strip()
+    target = tempfile.mkdtemp(prefix="import_baseline_")
+    archive = subprocess.run(
+        ["git", "-C", root, "archive", rev, "Retrieval"], capture_output=True, check=True
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+    return os.path.join(target, "Retrieval")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold import-time benchmark")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--baseline", default=None, help="Git revision to compare against")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {"current": benchmark(here, args.repeats)}
+    if args.baseline:
+        results[args.baseline] = benchmark(checkout(args.baseline), args.repeats)
+
+    for label, timings in results.items():
+        print(f"\n{label}")
+        print(f"{'module':<26}{'median (s)':>12}  heavy libraries loaded")
+        for module, (seconds, heavy) in timings.items():
+            shown = f"{seconds:12.3f}" if seconds is not None else f"{'failed':>12}"
+            print(f"{module:<26}{shown}  {heavy}")
@@ -0,0 +1,94 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes, or None where
+    /proc/self/statm is not available
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class BuildReport():
+    """
+    Wall time and peak memory of the stages of an index build. Memory is
+    the process RSS, sampled in the background; since stages may run
+    concurrently, a stage's peak is the highest RSS seen while it ran.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.running = {}
+        self.start = None
+        self.wall = None
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is None:
+            return
+        with self.lock:
+            self.peak = max(self.peak or 0, rss)
+            for name in self.running:
+                self.running[name] = max(self.running[name], rss)
+
+    def _sampler(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    @contextmanager
+    def build(self):
+        self.start = time.perf_counter()
+        self._stop.clear()
+        sampler = threading.Thread(target=self._sampler, daemon=True)
+        sampler.start()
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            sampler.join()
+            self._sample()
+            self.wall = time.perf_counter() - self.start
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        with self.lock:
+            self.running[name] = current_rss() or 0
+        try:
+            yield
+        finally:
+            self._sample()
+            with self.lock:
+                peak = self.running.pop(name)
+            self.stages[name] = {
+                "seconds": time.perf_counter() - start,
+                "peak_rss": peak or None,
+            }
+
+    def summary(self):
+        """
+        The report as a printable table
+        """
+
+        def mb(n):
+            return f"{n / 2**20:10.0f}" if n else f"{'-':>10}"
+
+        lines = [f"{'stage':<12}{'seconds':>10}{'peak MB':>10}"]
+        for name, stage in self.stages.items():
+            lines.append(f"{name:<12}{stage['seconds']:10.2f}{mb(stage['peak_rss'])}")
+        total = sum(stage["seconds"] for stage in self.stages.values())
+        lines.append(f"{'total':<12}{self.wall or 0:10.2f}{mb(self.peak)}")
+        lines.append(f"(stages sum to {total:.2f} s)")
+        return "\n".join(lines)
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class Facet():
+    """
+    Value -> documents postings (sorted doc id arrays) for one facet, plus
+    the reverse document -> values lists used for counting.
+    """
+
+    def __init__(self, values_per_doc):
+        self.value_ids = {}
+        doc_col, value_col = [], []
+        for doc_idx, values in enumerate(values_per_doc):
+            for value in dict.fromkeys(values):
+                doc_col.append(doc_idx)
+                value_col.append(self.value_ids.setdefault(value, len(self.value_ids)))
+        self.values = list(self.value_ids)
+
+        docs = np.asarray(doc_col, dtype=np.int32)
+        value_ids = np.asarray(value_col, dtype=np.int32)
+        n_values = len(self.values)
+
+        order = np.lexsort((docs, value_ids))
+        self.value_docs = docs[order]
+        self.value_ptr = np.searchsorted(value_ids[order], np.arange(n_values + 1))
+
+        # doc_col is already in document order
+        self.doc_values = value_ids
+        self.doc_ptr = np.searchsorted(docs, np.arange(len(values_per_doc) + 1))
+
+    def docs(self, value):
+        v = self.value_ids.get(value)
+        if v is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.value_docs[self.value_ptr[v]:self.value_ptr[v + 1]]
+
+    def doc_frequency(self):
+        return dict(zip(self.values, np.diff(self.value_ptr).tolist()))
+
+
+class FacetIndex():
+    """
+    Facet indexes (e.g. category, author, year) backed by sorted doc id
+    arrays, used to restrict scoring to a filtered document set.
+    """
+
+    def __init__(self):
+        self.facets = {}
+
+    def add(self, name, values_per_doc):
+        """
+        Index one facet
+
+        Parameters
+        ----------
+        arg1 : str
+            The facet name
+        arg2 : list
+            A list where the ith element is the list of values of the ith document
+        """
+
+        self.facets[name] = Facet(values_per_doc)
+
+    def values(self, name):
+        return self.facets[name].values
+
+    def filter(self, filters):
+        """
+        Documents matching every facet filter
+
+        Parameters
+        ----------
+        arg1 : dict
+            Maps a facet name to a value, a list of values (any of them may
+            match) or, for numeric facets, a (low, high) inclusive range
+
+        Returns
+        -------
+        numpy.ndarray or None
+            Sorted indices of the matching documents, or None if there is
+            nothing to filter on
+        """
+
+        matched = None
+        for name, wanted in (filters or {}).items():
+            if wanted is None or wanted == []:
+                continue
+            if name not in self.facets:
+                raise ValueError(f"Unknown facet '{name}'")
+            facet = self.facets[name]
+            if isinstance(wanted, tuple):
+                low, high = wanted
+                wanted = [v for v in facet.values if low <= v <= high]
+            elif not isinstance(wanted, (list, set)):
+                wanted = [wanted]
+            postings = [facet.docs(v) for v in wanted]
+            docs = np.unique(np.concatenate(postings)) if postings else np.zeros(0, dtype=np.int32)
+            matched = docs if matched is None else np.intersect1d(matched, docs, assume_unique=True)
+        return matched
+
+    def counts(self, doc_indices, name, top=10):
+        """
+        Most frequent values of a facet among the given documents
+
+        Returns
+        -------
+        list
+            (value, count) pairs, most frequent first
+        """
+
+        facet = self.facets[name]
+        doc_indices = np.asarray(doc_indices, dtype=np.int64)
+        if len(doc_indices) == 0:
+            return []
+        value_ids = np.concatenate([
+            facet.doc_values[facet.doc_ptr[d]:facet.doc_ptr[d + 1]] for d in doc_indices
+        ])
+        counts = np.bincount(value_ids, minlength=len(facet.values))
+        best = np.argsort(-counts, kind="stable")[:top]
+        return [(facet.values[v], int(counts[v])) for v in best if counts[v] > 0]
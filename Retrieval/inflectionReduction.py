@@ -1,9 +1,5 @@
 # Add your import statements here
-import nltk
-nltk.download('punkt')
-nltk.download('punkt_tab')
 import json
-from nltk.stem import PorterStemmer
 
 class InflectionReduction:
 	def reduce(self, text):
@@ -25,6 +21,7 @@ class InflectionReduction:
 
 		#Fill in code here
 		# Initialising the Porter Stemmer
+		from nltk.stem import PorterStemmer
 		porter_stemmer = PorterStemmer()
 		reducedText = [[porter_stemmer.stem(word) for word in sentence] for sentence in text]	
 		return reducedText
@@ -1,16 +1,22 @@
 import time
 import numpy as np
 from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import TruncatedSVD
-from sklearn.metrics.pairwise import cosine_similarity
-from gensim.models import KeyedVectors
-from nltk.tokenize import TreebankWordTokenizer
 from itertools import product
-from sentence_transformers import SentenceTransformer
-import faiss
+from concurrent.futures import ThreadPoolExecutor
+from positionalIndex import PositionalIndex
+from latencyBudget import LatencyBudget
+from queryCache import LRUCache
+from knnGraph import KnnGraph
+from buildReport import BuildReport
 
 
+# nltk, sklearn, gensim, faiss and sentence_transformers (torch) are imported
+# where they are first needed, so importing this module stays cheap.
+
+# Index structures built from the tokenized corpus, independently of each other
+BUILD_STAGES = ("bm25","positional","lsa","dpr")
+DPR_CTX_MODEL = 'facebook-dpr-ctx_encoder-multiset-base'
+
 class InformationRetrieval():
     def __init__(self,w2v_model_path):
         self.bm25 = None
@@ -18,15 +24,36 @@ class InformationRetrieval():
         self.docIDs = None
         self.tokenized_corpus = None
         self.lsa_matrix = None
-        self.dpr_encoder = SentenceTransformer('facebook-dpr-ctx_encoder-multiset-base')
-        self.vectorizer = TfidfVectorizer(min_df=1)
-        self.svd = TruncatedSVD(n_components=250)
+        self.lsa = None
+        self.lsa_ann = None
+        self.positional_index = None
+        self.doc_len = None
+        self.bm25_weights = None
+        self.bm25_vocab = None
+        self.stage_estimates = {}
+        self.expansion_cache = LRUCache(maxsize=50000)
+        self.query_embedding_cache = LRUCache(maxsize=5000)
+        self._dpr_encoder = None
+        self.dpr_doc_embeddings = None
+        self.dpr_index = None
+        self.vectorizer = None
+        self.svd = None
+        self.build_report = None
+        from gensim.models import KeyedVectors
         self.w2v = KeyedVectors.load_word2vec_format(w2v_model_path,binary=True)
         self.execution_time = 0
+        from nltk.tokenize import TreebankWordTokenizer
         self.tokenizer = TreebankWordTokenizer()
         self.best_config = None
         self.best_map = 0
         
+    @property
+    def dpr_encoder(self):
+        if self._dpr_encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._dpr_encoder = SentenceTransformer(DPR_CTX_MODEL)
+        return self._dpr_encoder
+
     def flatten_document(self,doc):
         return ' '.join(word for sentence in doc for word in sentence)
 
@@ -35,30 +62,155 @@ class InformationRetrieval():
             text = ' '.join(text)
         return self.tokenizer.tokenize(text)
 
-    def expand_query(self,query_tokens,top_n=5,min_similarity=0.8):
+    def expand_query(self,query_tokens,top_n=5,min_similarity=0.8,budget=None):
+        budget = budget or LatencyBudget()
         expanded = list(query_tokens)
         for word in query_tokens:
             if word in self.w2v.key_to_index:
-                similar = self.w2v.most_similar(word, topn=top_n)
+                similar = self.expansion_cache.get((word, top_n))
+                if similar is None:
+                    if not budget.allows("expansion"):
+                        budget.degrade("expansion")
+                        break
+                    with budget.stage("expansion"):
+                        similar = self.w2v.most_similar(word, topn=top_n)
+                    self.expansion_cache.put((word, top_n), similar)
                 expanded.extend([w for w, sim in similar if sim >= min_similarity])
         return expanded
 
-    def buildIndex(self,docs,docIDs,k1=1.5,b=0.75,n_components=250):
-        start_time = time.time()
-        self.docIDs = docIDs
-        
-        flattened_docs = [self.flatten_document(doc) for doc in docs]
-        self.tokenized_corpus = [self.tokenize(doc) for doc in flattened_docs]
-        
+    def match_phrases(self,phrases):
+        """
+        Intersect the documents matching every (processed phrase, slop) pair.
+        Phrases left without terms by preprocessing (e.g. only stopwords)
+        are skipped. Returns None when there are no phrases to match.
+        """
+        phrases = [(self.tokenize(self.flatten_document(phrase)),slop) for phrase,slop in phrases]
+        phrases = [(terms,slop) for terms,slop in phrases if terms]
+        if not phrases:
+            return None
+        if self.positional_index is None:
+            raise ValueError("Phrase queries need an index built with positional=True")
+        matched = None
+        for terms,slop in phrases:
+            docs = self.positional_index.match(terms,slop=slop)
+            matched = docs if matched is None else np.intersect1d(matched,docs,assume_unique=True)
+        return matched
+
+    def _bm25_scores(self,query_tokens,candidates=None):
+        if candidates is None:
+            return self.bm25.get_scores(query_tokens)
+        # Same formula as BM25Okapi.get_scores, restricted to the candidate docs
+        scores = np.zeros(len(candidates))
+        doc_len = self.doc_len[candidates]
+        norm = self.bm25.k1*(1-self.bm25.b+self.bm25.b*doc_len/self.bm25.avgdl)
+        for q in query_tokens:
+            idf = self.bm25.idf.get(q)
+            if not idf:
+                continue
+            q_freq = np.array([self.bm25.doc_freqs[i].get(q,0) for i in candidates])
+            scores += idf*(q_freq*(self.bm25.k1+1)/(q_freq+norm))
+        return scores
+
+    def _bm25_term_weights(self):
+        """
+        Sparse docs x terms matrix of the BM25 term weights
+        tf*(k1+1)/(tf+k1*(1-b+b*dl/avgdl)), built on first use
+        """
+        if self.bm25_weights is None:
+            from scipy.sparse import csr_matrix
+            vocab = {}
+            rows,cols,tfs = [],[],[]
+            for i,freqs in enumerate(self.bm25.doc_freqs):
+                for term,tf in freqs.items():
+                    rows.append(i)
+                    cols.append(vocab.setdefault(term,len(vocab)))
+                    tfs.append(tf)
+            rows = np.asarray(rows,dtype=np.int64)
+            tf = np.asarray(tfs,dtype=np.float64)
+            norm = self.bm25.k1*(1-self.bm25.b+self.bm25.b*self.doc_len/self.bm25.avgdl)
+            weights = tf*(self.bm25.k1+1)/(tf+norm[rows])
+            self.bm25_weights = csr_matrix((weights,(rows,cols)),shape=(len(self.bm25.doc_freqs),len(vocab)))
+            self.bm25_vocab = vocab
+        return self.bm25_weights,self.bm25_vocab
+
+    def bm25_batch(self,queries_tokens):
+        """
+        BM25 scores of every doc for a batch of token lists, as one sparse
+        matrix product. Row i equals _bm25_scores(queries_tokens[i]).
+        """
+        from scipy.sparse import csc_matrix
+        weights,vocab = self._bm25_term_weights()
+        rows,cols,idfs = [],[],[]
+        for j,tokens in enumerate(queries_tokens):
+            for q in tokens:
+                if q in vocab:
+                    rows.append(vocab[q])
+                    cols.append(j)
+                    idfs.append(self.bm25.idf.get(q) or 0)
+        # Repeated tokens are summed, as get_scores counts them once each
+        queries = csc_matrix((idfs,(rows,cols)),shape=(len(vocab),len(queries_tokens)))
+        return (weights @ queries).T.toarray()
+
+    def _tiered_bm25_scores(self,query_tokens,pool,hot,top_k,min_score):
+        """
+        BM25 scores of the hot tier alone if at least top_k of its docs
+        score min_score (a fraction of the highest score the query tokens
+        can reach) or more; otherwise of every doc, scoring the archival
+        tier too. Both tiers use the global BM25 statistics, so their scores
+        are comparable. Returns (scores, pool of the scored docs, tier).
+        """
+        if hot is None:
+            return self._bm25_scores(query_tokens,pool),pool,"all"
+        hot_pool = hot if pool is None else np.intersect1d(pool,hot,assume_unique=True)
+        hot_scores = self._bm25_scores(query_tokens,hot_pool)
+        ceiling = sum(self.bm25.idf.get(q,0)*(self.bm25.k1+1) for q in query_tokens)
+        if np.count_nonzero((hot_scores > 0) & (hot_scores >= min_score*ceiling)) >= top_k:
+            return hot_scores,hot_pool,"hot"
+        full = np.arange(len(self.docIDs)) if pool is None else pool
+        archival = np.setdiff1d(full,hot_pool,assume_unique=True)
+        scores = np.zeros(len(full))
+        scores[np.searchsorted(full,hot_pool)] = hot_scores
+        scores[np.searchsorted(full,archival)] = self._bm25_scores(query_tokens,archival)
+        return scores,pool,"all"
+
+    def _project_query(self,q_str):
+        if self.lsa is not None:
+            return self.lsa.transform([q_str])
+        return self.svd.transform(self.vectorizer.transform([q_str]))
+
+    def _build_bm25(self,k1,b):
         self.bm25 = BM25Okapi(self.tokenized_corpus,k1=k1,b=b)
-        
-        self.svd = TruncatedSVD(n_components=n_components)
+        self.doc_len = np.asarray(self.bm25.doc_len)
+        self.bm25_weights = None
+
+    def _build_positional(self):
+        self.positional_index = PositionalIndex()
+        self.positional_index.build(self.tokenized_corpus)
+
+    def _build_lsa(self,n_components,lsa_options,lsa_ann):
         joined_docs = [' '.join(doc) for doc in self.tokenized_corpus]
-        tfidf_mat = self.vectorizer.fit_transform(joined_docs)
-        self.lsa_matrix = self.svd.fit_transform(tfidf_mat)
-        self.dpr_encoder = SentenceTransformer('facebook-dpr-ctx_encoder-multiset-base')
-        self.dpr_index = None
+        if lsa_options is not None:
+            from lsaBuilder import StreamingLSA
+            self.lsa = StreamingLSA(n_components=n_components,**lsa_options)
+            self.lsa_matrix = self.lsa.fit_transform(joined_docs)
+        else:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.decomposition import TruncatedSVD
+            self.lsa = None
+            self.vectorizer = TfidfVectorizer(min_df=1)
+            self.svd = TruncatedSVD(n_components=n_components)
+            tfidf_mat = self.vectorizer.fit_transform(joined_docs)
+            self.lsa_matrix = self.svd.fit_transform(tfidf_mat)
+        self.lsa_ann = None
+        if lsa_ann:
+            import faiss
+            lsa_vectors = np.ascontiguousarray(self.lsa_matrix,dtype=np.float32)
+            faiss.normalize_L2(lsa_vectors)
+            self.lsa_ann = faiss.IndexHNSWFlat(lsa_vectors.shape[1],32,faiss.METRIC_INNER_PRODUCT)
+            self.lsa_ann.add(lsa_vectors)
 
+    def _build_dpr(self):
+        import faiss
         doc_texts = [' '.join(tokens)for tokens in self.tokenized_corpus]
         self.dpr_doc_embeddings =  self.dpr_encoder.encode(doc_texts,show_progress_bar = True,convert_to_numpy = True)
 
@@ -66,44 +218,185 @@ class InformationRetrieval():
         self.dpr_index = faiss.IndexFlatIP(dim)
         faiss.normalize_L2(self.dpr_doc_embeddings)
         self.dpr_index.add(self.dpr_doc_embeddings)
+
+    def buildIndex(self,docs,docIDs,k1=1.5,b=0.75,n_components=250,positional=False,lsa_options=None,lsa_ann=False,dpr=True,stages=None,workers=None):
+        """
+        dpr encodes the documents for DPR reranking (requires torch).
+        lsa_options, if given, are passed to StreamingLSA to fit LSA out of
+        core with a bounded vocabulary instead of in memory.
+        lsa_ann builds an HNSW index over the LSA vectors for cascade
+        candidate generation.
+        The stages in BUILD_STAGES only depend on the tokenized corpus and
+        run concurrently in up to workers threads (None: one per stage).
+        stages builds only the given subset, leaving the other structures
+        as they are; by default "bm25" and "lsa" are built, plus
+        "positional" and "dpr" if requested. self.build_report holds the
+        wall time and peak memory of each stage.
+        """
+        start_time = time.time()
+        if stages is None:
+            stages = [s for s in BUILD_STAGES if s in ("bm25","lsa") or (s == "positional" and positional) or (s == "dpr" and dpr)]
+        unknown = set(stages) - set(BUILD_STAGES)
+        if unknown:
+            raise ValueError(f"Unknown build stages: {sorted(unknown)}; expected a subset of {BUILD_STAGES}")
+        builders = {
+            "bm25": lambda: self._build_bm25(k1,b),
+            "positional": self._build_positional,
+            "lsa": lambda: self._build_lsa(n_components,lsa_options,lsa_ann),
+            "dpr": self._build_dpr,
+        }
+        self.docIDs = docIDs
+
+        self.build_report = BuildReport()
+        with self.build_report.build() as report:
+            with report.stage("tokenize"):
+                flattened_docs = [self.flatten_document(doc) for doc in docs]
+                self.tokenized_corpus = [self.tokenize(doc) for doc in flattened_docs]
+
+            def run(name):
+                with report.stage(name):
+                    builders[name]()
+
+            with ThreadPoolExecutor(max_workers=workers or max(len(stages),1)) as pool:
+                # result() re-raises the first failure of any stage
+                for future in [pool.submit(run,name) for name in stages]:
+                    future.result()
         self.execution_time = time.time() - start_time
         return self.execution_time
 
-    def rank(self,queries,top_n=5,min_similarity=0.8,alpha=0.7,use_dpr = False,dpr_top_k = 5):
-        start_time = time.time()
-        doc_IDs_ordered = []
-        
-        for query in queries:
-            query_tokens = self.tokenize(self.flatten_document(query))
-            expanded_query = self.expand_query(query_tokens,top_n=top_n,min_similarity=min_similarity)
-            bm25_scores = self.bm25.get_scores(expanded_query)
-            non_zero_indices = np.where(bm25_scores > 0)[0]
-            if len(non_zero_indices) == 0:
-                doc_IDs_ordered.append([])
-                continue
-                
-            max_bm25 = np.max(bm25_scores)
-            if max_bm25 > 0:
-                bm25_scores = bm25_scores/max_bm25
-            
-            q_str = ' '.join(expanded_query)
-            q_vec = self.vectorizer.transform([q_str])
-            q_lsa = self.svd.transform(q_vec)
-            
-            if alpha == 1.0: 
-                ranked_indices = np.argsort(bm25_scores)[::-1]
-            elif alpha == 0.0:  
-                lsa_scores = cosine_similarity(q_lsa, self.lsa_matrix).flatten()
-                ranked_indices = np.argsort(lsa_scores)[::-1]
-            else:  
-                lsa_scores = cosine_similarity(q_lsa, self.lsa_matrix).flatten()
-                combined_scores = alpha*bm25_scores+(1-alpha)*lsa_scores
-                ranked_indices = np.argsort(combined_scores)[::-1]
-            initial_top_k = ranked_indices[:dpr_top_k] if use_dpr else ranked_indices
-            if use_dpr:
-                # Encode query with DPR
-                dpr_query_vec = self.dpr_encoder.encode([' '.join(expanded_query)], convert_to_numpy=True)
-                faiss.normalize_L2(dpr_query_vec)
+    def build_knn_graph(self,k=10,source=None,fingerprint=""):
+        """
+        k nearest neighbour graph of the indexed docs, over the DPR
+        embeddings (searched with the DPR FAISS index) or the LSA vectors.
+        source defaults to "dpr" when DPR embeddings were built.
+        fingerprint identifies how the vectors were built; see KnnGraph.build.
+        """
+        if source is None:
+            source = "dpr" if self.dpr_doc_embeddings is not None else "lsa"
+        if source == "dpr":
+            if self.dpr_doc_embeddings is None:
+                raise ValueError("DPR embeddings were not built; index with use_dpr or use source='lsa'")
+            return KnnGraph().build(self.dpr_doc_embeddings,self.docIDs,k,source,index=self.dpr_index,fingerprint=fingerprint)
+        return KnnGraph().build(self.lsa_matrix,self.docIDs,k,source,fingerprint=fingerprint)
+
+    def _lsa_neighbours(self,q_lsa,k):
+        import faiss
+        q = np.ascontiguousarray(q_lsa,dtype=np.float32)
+        faiss.normalize_L2(q)
+        _, neighbours = self.lsa_ann.search(q,k)
+        return np.unique(neighbours[neighbours >= 0])
+
+    def _cascade(self,bm25_scores,pool,q_lsa,candidate_k,ann_k):
+        """
+        Candidate generation: the candidate_k best BM25 docs plus, if an LSA
+        ANN index was built, the ann_k nearest docs in LSA space. Returns the
+        sorted candidate doc indices and their BM25 scores.
+        """
+        keep = np.where(bm25_scores > 0)[0]
+        if len(keep) > candidate_k:
+            keep = keep[np.argpartition(-bm25_scores[keep],candidate_k)[:candidate_k]]
+        cands = keep if pool is None else pool[keep]
+        if ann_k and q_lsa is not None and self.lsa_ann is not None:
+            ann = self._lsa_neighbours(q_lsa,ann_k)
+            if pool is not None:
+                ann = ann[np.isin(ann,pool)]
+            cands = np.union1d(cands,ann)
+        else:
+            cands = np.sort(cands)
+        cand_bm25 = bm25_scores[cands] if pool is None else bm25_scores[np.searchsorted(pool,cands)]
+        return cands,cand_bm25
+
+    def rank_stages(self,query,top_n=5,min_similarity=0.8,alpha=0.7,use_dpr=False,dpr_top_k=5,candidates=None,candidate_k=None,ann_k=0,budget=None,hot=None,hot_min_score=0.2,precomputed_bm25=None,top_k=5):
+        """
+        Rank documents for a single query, stage by stage. Yields
+        (stage, ranked doc IDs, details) as soon as each ranking is ready:
+        first "lexical" (BM25/LSA), then "dpr" (the DPR-reranked top
+        dpr_top_k) if use_dpr. details is the dict
+        {"terms": query tokens, "expanded": expanded query tokens,
+        "scored": number of docs given an LSA/fused score,
+        "tier": "hot" or "all"}.
+        If candidates (sorted doc indices) is given, only those documents
+        are scored and returned.
+        With candidate_k, the ranking is a cascade: BM25 (and, with ann_k,
+        the LSA ANN index) select at most candidate_k (+ ann_k) docs and only
+        those are fused with LSA and returned. candidate_k=None scores every
+        doc exhaustively.
+        With hot (sorted doc indices of the hot tier), the hot tier is
+        searched first and the rest of the index only when fewer than top_k
+        hot docs reach hot_min_score; see _tiered_bm25_scores. top_k is the
+        number of results the caller needs; top_n is the number of Word2Vec
+        neighbours used for query expansion.
+        precomputed_bm25 are the BM25 scores of the expanded query over all
+        docs (a row of bm25_batch), used when neither candidates nor hot
+        restrict the docs.
+        With a LatencyBudget, the optional stages (Word2Vec expansion, LSA
+        fusion, DPR rerank) are cut short or skipped when the remaining time
+        is below their expected duration, and recorded in budget.degraded.
+        """
+        budget = budget or LatencyBudget(estimates=self.stage_estimates)
+        pool = None if candidates is None else np.asarray(candidates,dtype=np.int64)
+        query_tokens = self.tokenize(self.flatten_document(query))
+        expanded_query = self.expand_query(query_tokens,top_n=top_n,min_similarity=min_similarity,budget=budget)
+        details = {"terms": query_tokens, "expanded": expanded_query}
+        with budget.stage("bm25"):
+            if precomputed_bm25 is not None and pool is None and hot is None:
+                bm25_scores,details["tier"] = np.asarray(precomputed_bm25,dtype=np.float64),"all"
+            else:
+                bm25_scores,pool,details["tier"] = self._tiered_bm25_scores(
+                    expanded_query,pool,hot,top_k,hot_min_score
+                )
+        non_zero_indices = np.where(bm25_scores > 0)[0]
+        if len(non_zero_indices) == 0:
+            yield "lexical", [], details
+            return
+
+        max_bm25 = np.max(bm25_scores)
+        if max_bm25 > 0:
+            bm25_scores = bm25_scores/max_bm25
+
+        if alpha != 1.0 and not budget.allows("lsa"):
+            budget.degrade("lsa")
+            alpha = 1.0
+        if alpha == 1.0: 
+            if candidate_k is not None:
+                pool,bm25_scores = self._cascade(bm25_scores,pool,None,candidate_k,0)
+            ranked_indices = np.argsort(bm25_scores)[::-1]
+        else:
+            from sklearn.metrics.pairwise import cosine_similarity
+            with budget.stage("lsa"):
+                q_str = ' '.join(expanded_query)
+                q_lsa = self._project_query(q_str)
+                if candidate_k is not None:
+                    pool,bm25_scores = self._cascade(bm25_scores,pool,q_lsa,candidate_k,ann_k)
+                lsa_matrix = self.lsa_matrix if pool is None else self.lsa_matrix[pool]
+                lsa_scores = cosine_similarity(q_lsa, lsa_matrix).flatten()
+                if alpha == 0.0:  
+                    ranked_indices = np.argsort(lsa_scores)[::-1]
+                else:  
+                    combined_scores = alpha*bm25_scores+(1-alpha)*lsa_scores
+                    ranked_indices = np.argsort(combined_scores)[::-1]
+        details["scored"] = len(bm25_scores)
+        if pool is not None:
+            ranked_indices = pool[ranked_indices]
+        yield "lexical", [self.docIDs[i] for i in ranked_indices], details
+
+        if use_dpr:
+            import faiss
+            if self.dpr_doc_embeddings is None:
+                raise ValueError("DPR reranking needs an index built with dpr=True")
+            dpr_text = ' '.join(expanded_query)
+            dpr_query_vec = self.query_embedding_cache.get(dpr_text)
+            if dpr_query_vec is None:
+                if not budget.allows("dpr_encode"):
+                    budget.degrade("dpr")
+                    return
+                with budget.stage("dpr_encode"):
+                    # Encode query with DPR
+                    dpr_query_vec = self.dpr_encoder.encode([dpr_text], convert_to_numpy=True)
+                    faiss.normalize_L2(dpr_query_vec)
+                self.query_embedding_cache.put(dpr_text, dpr_query_vec)
+            with budget.stage("dpr"):
+                initial_top_k = ranked_indices[:dpr_top_k]
 
                 # Fetch only embeddings of top-k docs
                 top_k_embeddings = self.dpr_doc_embeddings[initial_top_k]
@@ -112,11 +405,31 @@ class InformationRetrieval():
                 # Sort the top_k docs using DPR scores
                 dpr_sorted_indices = np.argsort(dpr_scores)[::-1]
                 reranked_indices = [initial_top_k[i] for i in dpr_sorted_indices]
-                ranked_docIDs  = [self.docIDs[i] for i in reranked_indices]
-            else:
-                ranked_docIDs = [self.docIDs[i] for i in initial_top_k]
+            yield "dpr", [self.docIDs[i] for i in reranked_indices], details
+
+    def rank(self,queries,top_n=5,min_similarity=0.8,alpha=0.7,use_dpr = False,dpr_top_k = 5,candidates=None,candidate_k=None,ann_k=0,hot=None,hot_min_score=0.2,batch_size=None,top_k=5):
+        """
+        Rank documents for each query; see rank_stages.
+        With batch_size, the BM25 scores of each batch of queries are
+        computed together (see bm25_batch) when every doc is scored.
+        """
+        start_time = time.time()
+        doc_IDs_ordered = []
+        
+        batched = bool(batch_size) and candidates is None and hot is None
+        for i,query in enumerate(queries):
+            if batched and i % batch_size == 0:
+                batch_scores = self.bm25_batch([
+                    self.expand_query(self.tokenize(self.flatten_document(q)),top_n=top_n,min_similarity=min_similarity)
+                    for q in queries[i:i+batch_size]
+                ])
+            for _, ranked_docIDs, _ in self.rank_stages(
+                query,top_n=top_n,min_similarity=min_similarity,alpha=alpha,
+                use_dpr=use_dpr,dpr_top_k=dpr_top_k,candidates=candidates,
+                candidate_k=candidate_k,ann_k=ann_k,hot=hot,hot_min_score=hot_min_score,top_k=top_k,
+                precomputed_bm25=batch_scores[i % batch_size] if batched else None
+            ):
+                pass
             doc_IDs_ordered.append(ranked_docIDs) 
         self.execution_time += time.time() - start_time
         return [doc_IDs_ordered, self.execution_time]
-    
-    
\ No newline at end of file
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class KnnGraph():
+    """
+    The k nearest neighbours of every doc by cosine similarity of its
+    LSA vector or DPR embedding, computed once at index time so that
+    "similar papers" is answered with a row lookup.
+    """
+
+    def __init__(self):
+        self.neighbours = None
+        self.scores = None
+        self.doc_ids = []
+        self.source = None
+        self.fingerprint = ""
+
+    def build(self, vectors, doc_ids, k=10, source="lsa", index=None, batch_size=1024, fingerprint=""):
+        """
+        Parameters
+        ----------
+        arg1 : numpy.ndarray
+            Doc vectors, one row per doc
+        arg2 : list
+            The doc ID of each row
+        arg3 : int
+            Neighbours kept per doc
+        index : faiss.Index or None
+            An inner-product index over the L2-normalized vectors, searched
+            instead of computing the similarities block by block
+        fingerprint : str
+            Identifies how the vectors were built, so a saved graph is not
+            reused for different vectors
+        """
+
+        n = len(doc_ids)
+        k = max(min(k, n - 1), 0)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+
+        self.neighbours = np.full((n, k), -1, dtype=np.int32)
+        self.scores = np.zeros((n, k), dtype=np.float16)
+        for start in range(0, n if k else 0, batch_size):
+            rows = np.arange(start, min(start + batch_size, n))
+            if index is not None:
+                # One extra hit, as the doc itself is usually among them
+                sims, hits = index.search(vectors[rows], k + 1)
+            else:
+                block = vectors[rows] @ vectors.T
+                block[np.arange(len(rows)), rows] = -np.inf
+                hits = np.argpartition(-block, k - 1, axis=1)[:, :k]
+                sims = np.take_along_axis(block, hits, axis=1)
+            # Drop the doc itself and missing faiss hits (-1), then sort
+            sims = np.where((hits == rows[:, None]) | (hits < 0), -np.inf, sims)
+            order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+            sims = np.take_along_axis(sims, order, axis=1)
+            hits = np.take_along_axis(hits, order, axis=1)
+            found = np.isfinite(sims)
+            self.neighbours[rows] = np.where(found, hits, -1)
+            self.scores[rows] = np.where(found, sims, 0)
+
+        self.doc_ids = list(doc_ids)
+        self.source = source
+        self.fingerprint = fingerprint
+        return self
+
+    @property
+    def k(self):
+        return 0 if self.neighbours is None else self.neighbours.shape[1]
+
+    def similar(self, i, k=5):
+        """
+        The (doc index, cosine similarity) pairs of the k nearest
+        neighbours of doc i, most similar first
+        """
+
+        row = self.neighbours[i, :k]
+        keep = row >= 0
+        return list(zip(row[keep].tolist(), self.scores[i, :k][keep].astype(float).tolist()))
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            neighbours=self.neighbours,
+            scores=self.scores,
+            doc_ids=np.frombuffer("\n".join(self.doc_ids).encode("utf-8"), dtype=np.uint8),
+            source=np.array(self.source),
+            fingerprint=np.array(self.fingerprint),
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        graph = cls()
+        graph.neighbours = data["neighbours"]
+        graph.scores = data["scores"]
+        text = data["doc_ids"].tobytes().decode("utf-8")
+        graph.doc_ids = text.split("\n") if text else []
+        graph.source = str(data["source"])
+        graph.fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+        return graph
@@ -0,0 +1,53 @@
+import time
+from contextlib import contextmanager
+
+
+class LatencyBudget():
+    """
+    Time budget of a single query. Optional stages ask `allows(stage)`
+    before running; the answer compares the remaining time with a running
+    estimate of that stage's duration, shared across queries.
+    """
+
+    def __init__(self, deadline=None, estimates=None, smoothing=0.2):
+        """
+        Parameters
+        ----------
+        arg1 : float or None
+            The budget in seconds from now (None for no limit)
+        arg2 : dict
+            Running duration estimates {stage: seconds}, updated in place
+        """
+
+        self.start = time.perf_counter()
+        self.deadline = None if deadline is None else self.start + deadline
+        self.estimates = {} if estimates is None else estimates
+        self.smoothing = smoothing
+        self.timings = {}
+        self.degraded = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        if self.deadline is None:
+            return float("inf")
+        return self.deadline - time.perf_counter()
+
+    def allows(self, stage):
+        return self.remaining() > self.estimates.get(stage, 0.0)
+
+    def degrade(self, stage):
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        duration = time.perf_counter() - start
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+        previous = self.estimates.get(name)
+        self.estimates[name] = duration if previous is None else (
+            (1 - self.smoothing) * previous + self.smoothing * duration
+        )
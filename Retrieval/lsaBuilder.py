@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+
+# scipy and sklearn are imported by the methods that use them, so that reading
+# DEFAULT_MAX_FEATURES does not load them
+
+DEFAULT_MAX_FEATURES = 1 << 18
+
+
+class StreamingLSA():
+    """
+    Out-of-core LSA. Term counts are computed block by block and spilled to
+    disk, then a randomized SVD is fitted from repeated passes over those
+    blocks, so apart from the output document vectors the memory used is
+    bounded by the block size and the (pruned or hashed) vocabulary size,
+    not by the number of documents. The fit holds dense
+    n_terms x (n_components + n_oversamples) float64 matrices, so the bound
+    is only as tight as the vocabulary: by default terms in a single
+    document are dropped and at most DEFAULT_MAX_FEATURES are kept.
+
+    The TF-IDF weighting matches TfidfVectorizer's defaults (smooth idf,
+    l2-normalized rows).
+    """
+
+    def __init__(self, n_components=250, min_df=2, max_df=1.0, max_features=DEFAULT_MAX_FEATURES,
+                 n_features=None, block_size=10000, n_oversamples=10, n_iter=4,
+                 workdir=None, random_state=0):
+        self.n_components = n_components
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_features = max_features
+        self.n_features = n_features
+        self.block_size = block_size
+        self.n_oversamples = n_oversamples
+        self.n_iter = n_iter
+        self.workdir = workdir
+        self.random_state = random_state
+        if not n_features and max_features is None and min_df <= 1 and max_df >= 1.0:
+            warnings.warn(
+                "StreamingLSA without vocabulary pruning or hashing: memory grows "
+                "with the corpus vocabulary (set min_df, max_features or n_features)"
+            )
+        self.counter = None
+        self.idf = None
+        self.components_ = None
+        self.singular_values_ = None
+
+    def _blocks(self, docs):
+        for start in range(0, len(docs), self.block_size):
+            yield docs[start:start + self.block_size]
+
+    def _fit_counter(self, docs):
+        from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+        if self.n_features:
+            return HashingVectorizer(n_features=self.n_features, alternate_sign=False, norm=None)
+
+        analyzer = CountVectorizer().build_analyzer()
+        df = {}
+        for block in self._blocks(docs):
+            for doc in block:
+                for term in set(analyzer(doc)):
+                    df[term] = df.get(term, 0) + 1
+
+        max_count = self.max_df * len(docs) if isinstance(self.max_df, float) else self.max_df
+        kept = [t for t, n in df.items() if self.min_df <= n <= max_count]
+        if self.max_features and len(kept) > self.max_features:
+            kept.sort(key=lambda t: (-df[t], t))
+            kept = kept[:self.max_features]
+        if not kept:
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+        return CountVectorizer(vocabulary=sorted(kept))
+
+    def _tfidf(self, counts):
+        from sklearn.preprocessing import normalize
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    def _passes(self, paths):
+        import scipy.sparse as sp
+        for path in paths:
+            yield self._tfidf(sp.load_npz(path))
+
+    def fit_transform(self, docs):
+        """
+        Fit the model and return the LSA vectors of the documents
+
+        Parameters
+        ----------
+        arg1 : list
+            A list of strings, one per document (tokens joined by spaces)
+
+        Returns
+        -------
+        numpy.ndarray
+            The (n_docs, n_components) document vectors
+        """
+
+        import scipy.sparse as sp
+        self.counter = self._fit_counter(docs)
+        blockdir = tempfile.mkdtemp(prefix="lsa_blocks_", dir=self.workdir)
+        try:
+            # Pass 1: spill term counts to disk and accumulate document frequencies
+            paths = []
+            df = None
+            for i, block in enumerate(self._blocks(docs)):
+                counts = self.counter.transform(block).tocsr()
+                counts.sum_duplicates()
+                block_df = np.bincount(counts.indices, minlength=counts.shape[1])
+                df = block_df if df is None else df + block_df
+                paths.append(os.path.join(blockdir, f"counts_{i:05d}.npz"))
+                sp.save_npz(paths[-1], counts)
+            self.idf = np.log((1 + len(docs)) / (1 + df)) + 1
+
+            # Randomized range finder on A^T A, one pass over the blocks per iteration
+            n_terms = len(self.idf)
+            n_random = min(self.n_components + self.n_oversamples, n_terms)
+            rng = np.random.default_rng(self.random_state)
+            basis = rng.standard_normal((n_terms, n_random))
+            for _ in range(self.n_iter + 1):
+                sketch = np.zeros((n_terms, n_random))
+                for tfidf in self._passes(paths):
+                    sketch += tfidf.T @ (tfidf @ basis)
+                basis, _ = np.linalg.qr(sketch)
+
+            # Project onto the range and solve the small eigenproblem
+            gram = np.zeros((n_random, n_random))
+            for tfidf in self._passes(paths):
+                projected = tfidf @ basis
+                gram += projected.T @ projected
+            eigvals, eigvecs = np.linalg.eigh(gram)
+            top = np.argsort(eigvals)[::-1][:self.n_components]
+            self.singular_values_ = np.sqrt(np.clip(eigvals[top], 0, None))
+            self.components_ = (basis @ eigvecs[:, top]).T
+
+            lsa_matrix = np.empty((len(docs), len(top)), dtype=np.float32)
+            row = 0
+            for tfidf in self._passes(paths):
+                lsa_matrix[row:row + tfidf.shape[0]] = tfidf @ self.components_.T
+                row += tfidf.shape[0]
+            return lsa_matrix
+        finally:
+            shutil.rmtree(blockdir, ignore_errors=True)
+
+    def transform(self, texts):
+        """
+        LSA vectors of new texts (e.g. queries)
+        """
+
+        return self._tfidf(self.counter.transform(texts)) @ self.components_.T
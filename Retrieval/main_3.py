@@ -1,13 +1,27 @@
 import os
+import re
 import json
 import argparse
+import threading
+import time
+import numpy as np
 from sys import version_info
 from sentenceSegmentation import SentenceSegmentation
 from tokenization import Tokenization
 from inflectionReduction import InflectionReduction
 from stopwordRemoval import StopwordRemoval
-from information_Retrieval_3 import InformationRetrieval
+from information_Retrieval_3 import InformationRetrieval, DPR_CTX_MODEL
+from lsaBuilder import DEFAULT_MAX_FEATURES
+from facetIndex import FacetIndex
+from autocomplete import PrefixIndex
+from spellCorrection import SpellCorrector
+from snippets import SnippetIndex
+from latencyBudget import LatencyBudget
+from nearDuplicates import NearDuplicateDetector
+from queryCache import LRUCache, QueryLog, normalize_query
+from knnGraph import KnnGraph
 from evaluation import Evaluation
+from runCache import RunCache, config_hash, fingerprint, source_fingerprint
 
 # Python2/3 input() fix
 if version_info.major == 2:
@@ -16,6 +30,42 @@ if version_info.major == 2:
     except NameError:
         pass
 
+# "exact phrase" or "proximity terms"~N
+PHRASE_PATTERN = re.compile(r'"([^"]+)"(?:~(\d+))?')
+YEAR_PATTERN = re.compile(r'\b(\d{4})\b')
+WORD_PATTERN = re.compile(r'[a-z][a-z0-9]+')
+
+FACETS = ("categories", "authors", "year")
+
+# Arguments that do not change the ranked lists of an evaluation run
+NON_RETRIEVAL_ARGS = {
+    "out_folder", "custom", "grid_search", "queries", "qrels", "rerun",
+    "persist_autocomplete", "spell_correction", "snippets", "query_deadline",
+    "query_log", "warm_queries", "knn_k", "knn_source", "build_workers",
+    "eval_batch_size", "hot_fraction", "hot_min_score",
+}
+EVAL_KS = range(1, 11)
+
+class SearchResults(list):
+    """
+    The result docs of a search, with facet counts over the top ranked
+    docs attached as `facets` ({facet name: [(value, count), ...]}) and the
+    spelling corrections applied to the query as `corrections`
+    ({typed word: corrected word}). `stage` is the ranking stage that
+    produced the order ("lexical" or "dpr"). `degraded` lists the optional
+    stages skipped or cut short to meet the deadline and `timings` the
+    seconds spent in each stage. `tier` is "hot" when only the hot tier
+    of recent papers was searched, else "all".
+    """
+    def __init__(self, docs=(), facets=None, corrections=None, stage="lexical", budget=None, tier="all"):
+        super().__init__(docs)
+        self.facets = facets or {}
+        self.corrections = corrections or {}
+        self.stage = stage
+        self.degraded = list(budget.degraded) if budget else []
+        self.timings = dict(budget.timings) if budget else {}
+        self.tier = tier
+
 class SearchEngine:
     def __init__(self, args):
         self.args = args
@@ -27,6 +77,36 @@ class SearchEngine:
         self.evaluator = Evaluation()
         self._load_and_index()
 
+        self.resultCache = LRUCache(maxsize=1000)
+        self.queryLog = None
+        if getattr(self.args, "query_log", False):
+            os.makedirs(self.args.out_folder, exist_ok=True)
+            self.queryLog = QueryLog(os.path.join(self.args.out_folder, "query_log.tsv"))
+
+        # Set once the caches are warm; searches work before that, just slower
+        self.ready = threading.Event()
+        warm = getattr(self.args, "warm_queries", 0)
+        if self.queryLog is not None and warm:
+            threading.Thread(target=self._warm_caches, args=(warm,), daemon=True).start()
+        else:
+            self.ready.set()
+
+    def _warm_caches(self, n):
+        """
+        Replay the n most frequent logged queries to fill the result,
+        Word2Vec expansion and DPR query embedding caches.
+        """
+        try:
+            for query, top_k in self.queryLog.most_frequent(n):
+                try:
+                    for _ in self._cached_search(query, top_k, None, 100, None):
+                        pass
+                except ValueError:
+                    # e.g. a phrase query logged before the positional index was disabled
+                    continue
+        finally:
+            self.ready.set()
+
     def _load_and_index(self):
         snap_file = os.path.join(self.args.dataset, "arxiv-metadata-oai-snapshot.json")
         max_p = getattr(self.args, "max_papers", None)
@@ -51,6 +131,8 @@ class SearchEngine:
                     if isinstance(a,list) and len(a) >= 2
                 ]
                 categories = p.get('categories','').split()
+                versions = p.get('versions') or [{}]
+                year = YEAR_PATTERN.search(versions[0].get('created','') or p.get('update_date','') or '')
 
                 doc = {
                     "id":p.get("id",""),
@@ -58,14 +140,235 @@ class SearchEngine:
                     "body":body,
                     "abstract":p.get("abstract","").strip(),
                     "authors":authors,
-                    "categories":categories
+                    "categories":categories,
+                    "year":int(year.group(1)) if year else None,
+                    "updated":p.get("update_date","") or ""
                 }
                 self.docs_json.append(doc)
                 self.doc_ids.append(doc["id"])
                 raw_bodies.append(body)
 
-        processed = self.preprocessDocs(raw_bodies)
-        self.informationRetriever.buildIndex(processed, self.doc_ids)
+        if getattr(self.args, "snippets", False):
+            processed, spans = self.preprocessDocs(raw_bodies, with_spans=True)
+        else:
+            processed, spans = self.preprocessDocs(raw_bodies), None
+
+        self.aliases = {}
+        self.dedup_report = None
+        if getattr(self.args, "dedup", False):
+            keep = self._dedup(processed)
+            self.docs_json = [self.docs_json[i] for i in keep]
+            self.doc_ids   = [self.doc_ids[i] for i in keep]
+            raw_bodies     = [raw_bodies[i] for i in keep]
+            processed      = [processed[i] for i in keep]
+            if spans is not None:
+                spans = [spans[i] for i in keep]
+
+        self.doc_index = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self.hotTier = self._hot_tier()
+        self.facetIndex = FacetIndex()
+        for name in FACETS:
+            self.facetIndex.add(name, [
+                d[name] if isinstance(d[name], list) else [d[name]] if d[name] is not None else []
+                for d in self.docs_json
+            ])
+
+        self.term_df = self._count_terms(raw_bodies)
+        self._load_autocomplete()
+        self.spellCorrector = None
+        if getattr(self.args, "spell_correction", False):
+            self.spellCorrector = SpellCorrector()
+            self.spellCorrector.build(self.term_df)
+
+        self.snippetIndex = None
+        if spans is not None:
+            self.snippetIndex = SnippetIndex()
+            self.snippetIndex.build(
+                [self._abstract_spans(s, d) for s, d in zip(spans, self.docs_json)]
+            )
+        self.informationRetriever.buildIndex(
+            processed, self.doc_ids,
+            positional=getattr(self.args, "positional_index", False),
+            lsa_options=self._lsa_options(),
+            lsa_ann=getattr(self.args, "ann_k", 0) > 0,
+            dpr=getattr(self.args, "use_dpr", False),
+            stages=getattr(self.args, "build_stages", None),
+            workers=getattr(self.args, "build_workers", None)
+        )
+        print("Index build:\n" + self.informationRetriever.build_report.summary())
+        self._load_knn_graph()
+
+    def _hot_tier(self):
+        """
+        Sorted indices of the hot_fraction most recently updated docs
+        (by update_date, else submission year), or None if disabled.
+        """
+        fraction = getattr(self.args, "hot_fraction", 0)
+        if not fraction or fraction >= 1:
+            return None
+        recency = sorted(
+            range(len(self.docs_json)),
+            key=lambda i: (self.docs_json[i]["updated"] or str(self.docs_json[i]["year"] or "")),
+            reverse=True
+        )
+        return np.sort(np.array(recency[:int(len(recency) * fraction)], dtype=np.int64))
+
+    def _dedup(self, processed):
+        """
+        Cluster near-duplicate docs and keep one representative per cluster.
+        The other members become aliases of the representative: they are
+        listed in its "aliases" and resolved by lookup().
+        Returns the indices of the docs to index.
+        """
+        detector = NearDuplicateDetector(threshold=getattr(self.args, "dedup_threshold", 0.8))
+        tokens = [[t for sentence in doc for t in sentence] for doc in processed]
+        representative = detector.clusters(tokens)
+
+        keep = []
+        for i, rep in enumerate(representative):
+            if rep == i:
+                keep.append(i)
+                continue
+            rep_doc = self.docs_json[rep]
+            rep_doc.setdefault("aliases", []).append(self.docs_json[i]["id"])
+            self.aliases[self.docs_json[i]["id"]] = rep_doc["id"]
+
+        dropped = len(processed) - len(keep)
+        total_tokens = sum(len(t) for t in tokens)
+        saved_tokens = total_tokens - sum(len(tokens[i]) for i in keep)
+        self.dedup_report = {
+            "docs": len(processed),
+            "indexed": len(keep),
+            "duplicates": dropped,
+            "clusters": len({rep for i, rep in enumerate(representative) if rep != i}),
+            "tokens_saved": saved_tokens,
+            "fraction_saved": saved_tokens / total_tokens if total_tokens else 0.0
+        }
+        print(
+            f"Near-duplicates: indexed {len(keep)} of {len(processed)} docs "
+            f"({dropped} aliases in {self.dedup_report['clusters']} clusters, "
+            f"{self.dedup_report['fraction_saved']:.1%} of tokens saved)"
+        )
+        return keep
+
+    def lookup(self, paper_id):
+        """
+        The doc of a paper id, following near-duplicate aliases.
+        """
+        idx = self.doc_index.get(self.aliases.get(paper_id, paper_id))
+        return None if idx is None else self.docs_json[idx]
+
+    def _load_knn_graph(self):
+        """
+        Load the "similar papers" graph from out_folder if it was built for
+        the same docs, at least knn_k neighbours and vectors built the same
+        way (see _knn_fingerprint); otherwise build and save it.
+        """
+        self.knnGraph = None
+        k = getattr(self.args, "knn_k", 0)
+        if not k:
+            return
+        source = getattr(self.args, "knn_source", None)
+        if source is None:
+            source = "dpr" if getattr(self.args, "use_dpr", False) else "lsa"
+        path = os.path.join(self.args.out_folder, f"knn_graph_{source}.npz")
+        if os.path.exists(path):
+            graph = KnnGraph.load(path)
+            if (graph.doc_ids == self.doc_ids and graph.k >= min(k, len(self.doc_ids) - 1)
+                    and graph.fingerprint == self._knn_fingerprint(source)):
+                self.knnGraph = graph
+                return
+        self.knnGraph = self.informationRetriever.build_knn_graph(k, source, self._knn_fingerprint(source))
+        os.makedirs(self.args.out_folder, exist_ok=True)
+        self.knnGraph.save(path)
+
+    def _knn_fingerprint(self, source):
+        """
+        Hash of the settings the kNN graph's vectors depend on: the
+        preprocessing and either the LSA setup or the DPR model.
+        """
+        config = {
+            "source": source,
+            "segmenter": self.args.segmenter,
+            "tokenizer": self.args.tokenizer,
+        }
+        if source == "dpr":
+            config["model"] = DPR_CTX_MODEL
+        else:
+            options = self._lsa_options()
+            if options is not None:
+                options.pop("workdir")
+            config["lsa"] = options
+            config["n_components"] = self.informationRetriever.lsa_matrix.shape[1]
+        return config_hash(config)
+
+    def similar_papers(self, paper_id, k=5):
+        """
+        The k papers most similar to a paper, read from the precomputed
+        kNN graph. Each doc is a copy carrying its cosine "similarity".
+        Raises KeyError for an unknown paper id.
+        """
+        if self.knnGraph is None:
+            raise ValueError("Similar papers need the kNN graph; start the engine with knn_k > 0")
+        paper_id = self.aliases.get(paper_id, paper_id)
+        if paper_id not in self.doc_index:
+            raise KeyError(paper_id)
+        return [
+            dict(self.docs_json[i], similarity=score)
+            for i, score in self.knnGraph.similar(self.doc_index[paper_id], k)
+        ]
+
+    def _lsa_options(self):
+        if not getattr(self.args, "streaming_lsa", False):
+            return None
+        return {
+            "min_df": getattr(self.args, "lsa_min_df", 2),
+            "max_df": getattr(self.args, "lsa_max_df", 1.0),
+            "max_features": getattr(self.args, "lsa_max_features", DEFAULT_MAX_FEATURES),
+            "n_features": getattr(self.args, "lsa_hash_features", None),
+            "block_size": getattr(self.args, "lsa_block_size", 10000),
+            "workdir": self.args.out_folder if os.path.isdir(self.args.out_folder) else None
+        }
+
+    def _count_terms(self, texts):
+        """
+        Document frequency of every lowercased word in the raw texts.
+        """
+        term_df = {}
+        for text in texts:
+            for term in set(WORD_PATTERN.findall(text.lower())):
+                term_df[term] = term_df.get(term, 0) + 1
+        return term_df
+
+    def _load_autocomplete(self):
+        path = os.path.join(self.args.out_folder, "autocomplete.npz")
+        persist = getattr(self.args, "persist_autocomplete", False)
+        titles = [d["title"] for d in self.docs_json]
+        if persist and os.path.exists(path):
+            self.prefixIndex = PrefixIndex.load(path)
+            # Reuse it only if it was built from the same vocabulary and titles
+            if self.prefixIndex.fingerprint == PrefixIndex.source_fingerprint(self.term_df, titles):
+                return
+        self.prefixIndex = PrefixIndex()
+        self.prefixIndex.build(self.term_df, titles)
+        if persist:
+            os.makedirs(self.args.out_folder, exist_ok=True)
+            self.prefixIndex.save(path)
+
+    def _cascade_options(self):
+        if getattr(self.args, "exhaustive", False):
+            return {"candidate_k": None, "ann_k": 0}
+        return {
+            "candidate_k": getattr(self.args, "candidate_k", None),
+            "ann_k": getattr(self.args, "ann_k", 0)
+        }
+
+    def suggest(self, prefix, k=5):
+        """
+        Autocomplete suggestions for a partially typed query; see
+        PrefixIndex.suggest. Does not touch the ranking path.
+        """
+        return self.prefixIndex.suggest(prefix, k)
 
     def segmentSentences(self, text):
         if self.args.segmenter == "naive":
@@ -90,37 +393,303 @@ class SearchEngine:
         clean = [self.removeStopwords(r)  for r in red]
         return clean
 
-    def preprocessDocs(self, docs):
+    def preprocessDocs(self, docs, with_spans=False):
         seg = [self.segmentSentences(d) for d in docs]
         tok = [self.tokenize(s)         for s in seg]
         red = [self.reduceInflection(t) for t in tok]
         clean = [self.removeStopwords(r)  for r in red]
-        return clean
+        if not with_spans:
+            return clean
+        spans = [self._token_spans(*doc) for doc in zip(docs, tok, red, clean)]
+        return clean, spans
+
+    def _token_spans(self, text, tokens, reduced, clean):
+        """
+        (start, end, reduced token) for every token kept by stopword removal,
+        found by aligning the tokens with the text left to right.
+        """
+        spans = []
+        cursor = 0
+        for tok_sent, red_sent, clean_sent in zip(tokens, reduced, clean):
+            kept = 0
+            for token, term in zip(tok_sent, red_sent):
+                start = text.find(token, cursor)
+                is_kept = kept < len(clean_sent) and clean_sent[kept] == term
+                kept += is_kept
+                if start < 0:
+                    # Rewritten by the tokenizer (e.g. quotes)
+                    continue
+                cursor = start + len(token)
+                if is_kept:
+                    spans.append((start, cursor, term))
+        return spans
+
+    def _abstract_spans(self, spans, doc):
+        # body is "<title>. <abstract>"
+        offset = len(doc["title"]) + 2
+        return [(s - offset, e - offset, t) for s, e, t in spans if s >= offset]
+
+    def _with_snippets(self, docs, ranked, details):
+        terms = set(details["terms"])
+        terms.update(t for s in self.reduceInflection([details["expanded"]]) for t in s)
+        return [
+            dict(doc, snippet=self.snippetIndex.snippet(i, doc["abstract"], terms))
+            for doc, i in zip(docs, ranked)
+        ]
 
-    def search_papers(self,query,top_k=5):
+    def parseQuery(self, query):
+        """
+        Split a query string into its free text and its quoted phrases.
+        Phrases are returned as (text, slop) pairs; slop is None for an
+        exact phrase and N for a "..."~N proximity window.
+        """
+        phrases = [
+            (m.group(1), int(m.group(2)) if m.group(2) else None)
+            for m in PHRASE_PATTERN.finditer(query)
+        ]
+        text = PHRASE_PATTERN.sub(lambda m: f" {m.group(1)} ", query)
+        return text, phrases
+
+    def search_papers(self,query,top_k=5,filters=None,facet_depth=100,deadline=None,all_years=False):
         """
         Return top_k docs for a single query string.
+        Quoted phrases only match documents containing them.
+        filters maps a facet in FACETS to a value, a list of values or a
+        (low, high) year range; only matching docs are scored.
+        Facet counts are computed over the top facet_depth ranked docs.
+        With snippets enabled, each result doc is a copy carrying a
+        "snippet" with the query and expansion terms highlighted.
+        deadline is a time budget in seconds: optional stages (spelling
+        correction, Word2Vec expansion, LSA fusion, DPR rerank) are skipped
+        or cut short when it is at risk, and listed in results.degraded.
+        With a hot tier (hot_fraction), recent papers are searched first and
+        the archive only if they cannot fill top_k with good enough scores,
+        or if all_years is set; results.tier tells which happened.
         """
-        proc_q = self.preprocessQueries([query])[0]
-        ranked_ids = self.informationRetriever.rank([proc_q],top_n=top_k)[0][0]
-        ranked_ids = ranked_ids[:top_k]
-        results = []
-        for doc_id in ranked_ids:
-            doc = next((d for d in self.docs_json if d["id"] == doc_id), None)
-            if doc:
-                results.append(doc)
+        for results in self.search_papers_stream(query, top_k, filters, facet_depth, deadline, all_years):
+            pass
         return results
+
+    def search_papers_stream(self,query,top_k=5,filters=None,facet_depth=100,deadline=None,all_years=False):
+        """
+        Same as search_papers, but yields the lexical (BM25/LSA) results as
+        soon as they are ranked and then, if use_dpr is set, the DPR-reranked
+        results. Each SearchResults has its `stage` set accordingly.
+        Results of searches that were not degraded are cached.
+        """
+        if self.queryLog is not None:
+            self.queryLog.record(query, top_k)
+        yield from self._cached_search(query, top_k, filters, facet_depth, deadline, all_years)
+
+    def _filter_key(self, filters):
+        """
+        Canonical, hashable form of filters as FacetIndex.filter reads them:
+        a tuple is an inclusive range, a list or set any of its values.
+        Empty filters are skipped there, so they share the key of no filters.
+        """
+        key = []
+        for name, wanted in (filters or {}).items():
+            if wanted is None or wanted == []:
+                continue
+            if isinstance(wanted, tuple):
+                key.append((name, "range") + wanted)
+            elif isinstance(wanted, (list, set)):
+                key.append((name, "any") + tuple(sorted(set(wanted))))
+            else:
+                key.append((name, "any", wanted))
+        return tuple(sorted(key))
+
+    def _cached_search(self,query,top_k,filters,facet_depth,deadline,all_years=False):
+        key = (normalize_query(query), top_k, facet_depth, all_years, self._filter_key(filters))
+        cached = self.resultCache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        for results in self._search(query, top_k, filters, facet_depth, deadline, all_years):
+            yield results
+        if not results.degraded:
+            self.resultCache.put(key, results)
+
+    def _search(self,query,top_k,filters,facet_depth,deadline,all_years):
+        budget = LatencyBudget(deadline, self.informationRetriever.stage_estimates)
+        corrections = {}
+        if self.spellCorrector is not None:
+            if budget.allows("spelling"):
+                with budget.stage("spelling"):
+                    query, corrections = self.spellCorrector.correct_query(query)
+            else:
+                budget.degrade("spelling")
+        with budget.stage("preprocess"):
+            text, phrases = self.parseQuery(query)
+            proc_q = self.preprocessQueries([text])[0]
+            proc_phrases = [(self.preprocessQueries([p])[0], slop) for p, slop in phrases]
+        with budget.stage("filter"):
+            candidates = self.informationRetriever.match_phrases(proc_phrases)
+            filtered = self.facetIndex.filter(filters)
+            if filtered is not None:
+                candidates = filtered if candidates is None else np.intersect1d(candidates, filtered, assume_unique=True)
+        if candidates is not None and len(candidates) == 0:
+            yield SearchResults(corrections=corrections, budget=budget)
+            return
+        stages = self.informationRetriever.rank_stages(
+            proc_q, top_n=top_k, top_k=top_k, candidates=candidates,
+            use_dpr=getattr(self.args, "use_dpr", False),
+            dpr_top_k=getattr(self.args, "dpr_top_k", 20),
+            budget=budget,
+            hot=None if all_years else self.hotTier,
+            hot_min_score=getattr(self.args, "hot_min_score", 0.2),
+            **self._cascade_options()
+        )
+        for stage, ranked_ids, details in stages:
+            ranked = [self.doc_index[doc_id] for doc_id in ranked_ids[:max(top_k, facet_depth)]]
+            facets = {name: self.facetIndex.counts(ranked, name) for name in FACETS}
+            docs = [self.docs_json[i] for i in ranked[:top_k]]
+            if self.snippetIndex is not None:
+                docs = self._with_snippets(docs, ranked, details)
+            results = SearchResults(docs, facets, corrections, stage, budget, details["tier"])
+            yield results
+        # Stages skipped after the last yield (e.g. the DPR rerank): yield the
+        # same results again so streaming consumers learn about them
+        if budget.degraded != results.degraded:
+            yield SearchResults(results, results.facets, corrections, results.stage, budget, results.tier)
+
+    def retrieveRun(self, queries, depth=100):
+        """
+        The top depth doc IDs of each query string, ranked through the
+        batched path of InformationRetrieval.rank without a deadline.
+        The whole index is ranked, bypassing the hot tier, so every query
+        gets depth docs when the index has them.
+        Returns (rankings, seconds spent retrieving).
+        """
+        start = time.perf_counter()
+        ranked, _ = self.informationRetriever.rank(
+            self.preprocessQueries(queries),
+            use_dpr=getattr(self.args, "use_dpr", False),
+            dpr_top_k=getattr(self.args, "dpr_top_k", 20),
+            top_k=depth,
+            batch_size=getattr(self.args, "eval_batch_size", 64),
+            **self._cascade_options()
+        )
+        return [doc_ids[:depth] for doc_ids in ranked], time.perf_counter() - start
+
     def handleCustomQuery(self):
         """
         CLI mode: ask for a single query on the console.
         """
         print("Enter query below:")
         q = input().strip()
-        res = self.search_papers(q,top_k=5)
+        res = self.search_papers(q,top_k=5,deadline=getattr(self.args, "query_deadline", None))
+        if res.corrections:
+            print("Corrected: " + ", ".join(f"{w} → {c}" for w, c in res.corrections.items()))
+        if res.degraded:
+            print("Skipped to meet the deadline: " + ", ".join(res.degraded))
         for i, paper in enumerate(res, 1):
             print(f"{i}. {paper['title']}  →  https://arxiv.org/abs/{paper['id']}")
 
 
+def _integer_ids(run, query_ids, qrels):
+    """
+    Evaluation compares integer IDs; map the query IDs and doc IDs (e.g.
+    arXiv IDs) of the run and the qrels to integers consistently.
+    """
+    doc_numbers = {}
+    def number(doc_id):
+        return doc_numbers.setdefault(str(doc_id), len(doc_numbers))
+    query_numbers = {qid: i for i, qid in enumerate(query_ids)}
+    ranked = [[number(d) for d in run[qid]] for qid in query_ids]
+    int_qrels = []
+    for qrel in qrels:
+        if str(qrel["query_num"]) in query_numbers:
+            # Binary judgements get the position of a fully relevant doc
+            int_qrel = {"position": 1}
+            int_qrel.update(qrel)
+            int_qrel.update(query_num=query_numbers[str(qrel["query_num"])], id=number(qrel["id"]))
+            int_qrels.append(int_qrel)
+    return ranked, list(range(len(query_ids))), int_qrels
+
+
+def evaluateDataset(args):
+    """
+    Evaluate retrieval on a query set and its relevance judgements, in the
+    Cranfield JSON format ([{"query number", "query"}] and [{"query_num",
+    "id", "position"}]). The run is written to out_folder/runs as a TREC
+    run file named by a hash of the configuration, dataset, queries and
+    code, and reused on the next evaluation with the same hash, so only
+    metrics and plots are recomputed. Prints precision, recall, F-score,
+    MAP and nDCG @1-10 with the retrieval latency and saves them (and a
+    plot, if matplotlib is installed) next to the run.
+    """
+    queries_path = args.queries or os.path.join(args.dataset, "queries.json")
+    qrels_path = args.qrels or os.path.join(args.dataset, "qrels.json")
+    with open(queries_path, 'r', encoding='utf-8') as f:
+        queries_json = json.load(f)
+    with open(qrels_path, 'r', encoding='utf-8') as f:
+        qrels = json.load(f)
+    query_ids = [str(q["query number"]) for q in queries_json]
+
+    snap_file = os.path.join(args.dataset, "arxiv-metadata-oai-snapshot.json")
+    snap = os.stat(snap_file)
+    config = {k: v for k, v in vars(args).items() if k not in NON_RETRIEVAL_ARGS}
+    config.update(
+        snapshot=[snap.st_size, int(snap.st_mtime)],
+        queries_sha1=fingerprint(queries_path),
+        code_sha1=source_fingerprint(os.path.dirname(os.path.abspath(__file__)))
+    )
+    cache = RunCache(os.path.join(args.out_folder, "runs"))
+    key = cache.key(config)
+    cached = None if args.rerun else cache.load(key)
+    if cached is not None:
+        run, meta = cached
+        print(f"Reusing cached run {cache.path(key)}")
+    else:
+        engine = SearchEngine(args)
+        rankings, seconds = engine.retrieveRun([q["query"] for q in queries_json], args.eval_depth)
+        run = dict(zip(query_ids, rankings))
+        meta = cache.save(key, run, {
+            "config": config,
+            "index_seconds": engine.informationRetriever.execution_time,
+            "retrieval_seconds": seconds,
+            "ms_per_query": 1000 * seconds / max(len(query_ids), 1),
+        })
+        print(f"Wrote run {cache.path(key)}")
+
+    evaluator = Evaluation()
+    ranked, int_query_ids, int_qrels = _integer_ids(run, query_ids, qrels)
+    metrics = {name: [] for name in ("precision", "recall", "fscore", "MAP", "nDCG")}
+    for k in EVAL_KS:
+        metrics["precision"].append(evaluator.meanPrecision(ranked, int_query_ids, int_qrels, k))
+        metrics["recall"].append(evaluator.meanRecall(ranked, int_query_ids, int_qrels, k))
+        metrics["fscore"].append(evaluator.meanFscore(ranked, int_query_ids, int_qrels, k))
+        metrics["MAP"].append(evaluator.meanAveragePrecision(ranked, int_query_ids, int_qrels, k))
+        metrics["nDCG"].append(evaluator.meanNDCG(ranked, int_query_ids, int_qrels, k))
+
+    print(f"{'k':>3}" + "".join(f"{name:>11}" for name in metrics))
+    for i, k in enumerate(EVAL_KS):
+        print(f"{k:>3}" + "".join(f"{values[i]:11.4f}" for values in metrics.values()))
+    print(f"Retrieval: {meta['ms_per_query']:.1f} ms/query, index build: {meta['index_seconds']:.1f} s")
+
+    with open(cache.path(key, ".metrics.json"), 'w', encoding='utf-8') as f:
+        json.dump({
+            "qrels_sha1": fingerprint(qrels_path), "ks": list(EVAL_KS), "metrics": metrics,
+            "ms_per_query": meta["ms_per_query"], "index_seconds": meta["index_seconds"]
+        }, f, indent=2)
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed; skipping the plot")
+        return metrics
+    for name, values in metrics.items():
+        plt.plot(list(EVAL_KS), values, label=name)
+    plt.legend()
+    plt.title(f"Evaluation metrics ({key})")
+    plt.xlabel("k")
+    plt.savefig(cache.path(key, ".png"))
+    plt.close()
+    return metrics
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='main_3.py CLI')
     parser.add_argument(
@@ -158,6 +727,122 @@ if __name__ == "__main__":
         "--grid_search", action="store_true",
         help="Perform grid-search on Cranfield eval"
     )
+    parser.add_argument(
+        "--queries", default=None,
+        help="Evaluation queries in Cranfield JSON format (default: <dataset>/queries.json)"
+    )
+    parser.add_argument(
+        "--qrels", default=None,
+        help="Relevance judgements in Cranfield JSON format (default: <dataset>/qrels.json)"
+    )
+    parser.add_argument(
+        "--eval_depth", type=int, default=100,
+        help="Docs per query written to the evaluation run file"
+    )
+    parser.add_argument(
+        "--eval_batch_size", type=int, default=64,
+        help="Queries whose BM25 scores are computed together during evaluation"
+    )
+    parser.add_argument(
+        "--rerun", action="store_true",
+        help="Ignore a cached evaluation run with the same configuration"
+    )
+    parser.add_argument(
+        "--positional_index", action="store_true",
+        help="Build a positional index for \"phrase\" and \"proximity\"~N queries"
+    )
+    parser.add_argument(
+        "--persist_autocomplete", action="store_true",
+        help="Save the autocomplete index to out_folder and reuse it on the next start"
+    )
+    parser.add_argument(
+        "--spell_correction", action="store_true",
+        help="Correct misspelled query words against the corpus vocabulary"
+    )
+    parser.add_argument(
+        "--snippets", action="store_true",
+        help="Store token offsets to return highlighted snippets with results"
+    )
+    parser.add_argument(
+        "--streaming_lsa", action="store_true",
+        help="Fit LSA out of core from TF-IDF blocks spilled to out_folder"
+    )
+    parser.add_argument(
+        "--lsa_min_df", type=int, default=2,
+        help="Streaming LSA: drop terms in fewer than this many docs"
+    )
+    parser.add_argument(
+        "--lsa_max_df", type=float, default=1.0,
+        help="Streaming LSA: drop terms in more than this fraction of docs"
+    )
+    parser.add_argument(
+        "--lsa_max_features", type=int, default=DEFAULT_MAX_FEATURES,
+        help="Streaming LSA: keep only the most frequent terms"
+    )
+    parser.add_argument(
+        "--lsa_hash_features", type=int, default=None,
+        help="Streaming LSA: hash terms into this many features instead of keeping a vocabulary"
+    )
+    parser.add_argument(
+        "--lsa_block_size", type=int, default=10000,
+        help="Streaming LSA: documents per TF-IDF block"
+    )
+    parser.add_argument(
+        "--candidate_k", type=int, default=1000,
+        help="Cascade: BM25 candidates passed on to LSA fusion"
+    )
+    parser.add_argument(
+        "--ann_k", type=int, default=0,
+        help="Cascade: extra candidates from an LSA ANN index (0 disables it)"
+    )
+    parser.add_argument(
+        "--exhaustive", action="store_true",
+        help="Score every doc at every stage (disables the cascade)"
+    )
+    parser.add_argument(
+        "--query_deadline", type=float, default=None,
+        help="Per-query time budget in seconds; optional stages are skipped to meet it"
+    )
+    parser.add_argument(
+        "--dedup", action="store_true",
+        help="Index one representative per cluster of near-duplicate abstracts"
+    )
+    parser.add_argument(
+        "--dedup_threshold", type=float, default=0.8,
+        help="Estimated Jaccard similarity above which abstracts are near-duplicates"
+    )
+    parser.add_argument(
+        "--query_log", action="store_true",
+        help="Record normalized queries to out_folder/query_log.tsv"
+    )
+    parser.add_argument(
+        "--warm_queries", type=int, default=0,
+        help="At startup, replay the N most frequent logged queries to warm the caches"
+    )
+    parser.add_argument(
+        "--build_stages", type=lambda s: [x.strip() for x in s.split(",") if x.strip()], default=None,
+        help="Comma-separated index stages to build: bm25,positional,lsa,dpr (default: all enabled ones)"
+    )
+    parser.add_argument(
+        "--build_workers", type=int, default=None,
+        help="Threads for the concurrent index build stages (default: one per stage)"
+    )
+    parser.add_argument(
+        "--hot_fraction", type=float, default=0,
+        help="Search the most recently updated fraction of papers first (0 disables the hot tier)"
+    )
+    parser.add_argument(
+        "--hot_min_score", type=float, default=0.2,
+        help="Hot tier: fraction of the best possible BM25 score top_k hot papers must reach"
+    )
+    parser.add_argument(
+        "--knn_k", type=int, default=0,
+        help="Precompute the N nearest neighbours of every paper for similar papers (0 disables it)"
+    )
+    parser.add_argument(
+        "--knn_source", choices=["lsa", "dpr"], default=None,
+        help="Vectors for the similar papers graph (default: dpr with --use_dpr, else lsa)"
+    )
     parser.add_argument(
         "--use_dpr", action="store_true",
         help="Enable DPR reranking (requires torch & transformers)"
@@ -168,7 +853,8 @@ if __name__ == "__main__":
     )
 
     args = parser.parse_args()
-    engine = SearchEngine(args)
 
     if args.custom:
-        engine.handleCustomQuery()
\ No newline at end of file
+        SearchEngine(args).handleCustomQuery()
+    else:
+        evaluateDataset(args)
\ No newline at end of file
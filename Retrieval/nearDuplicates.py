@@ -0,0 +1,84 @@
+import zlib
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class NearDuplicateDetector():
+    """
+    MinHash / LSH near-duplicate detection over token streams. Documents
+    whose signatures collide in at least one LSH band are compared, and
+    those with an estimated Jaccard similarity of their shingle sets above
+    the threshold are clustered together.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=32, shingle_size=3, seed=0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, tokens):
+        """
+        MinHash signature of the shingles of a token list, or None if the
+        list is shorter than one shingle
+        """
+
+        n = self.shingle_size
+        shingles = {' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+        if not shingles:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # Universal hashing; the uint64 products wrap around, as in datasketch
+        with np.errstate(over='ignore'):
+            permuted = (hashes[:, None] * self.a + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+    def clusters(self, docs):
+        """
+        Group near-duplicate documents
+
+        Parameters
+        ----------
+        arg1 : list
+            A list where the ith element is the token list of the ith document
+
+        Returns
+        -------
+        list
+            A list where the ith element is the index of the representative
+            of the ith document's cluster (the lowest index in the cluster)
+        """
+
+        signatures = [self.signature(tokens) for tokens in docs]
+        parent = list(range(len(docs)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        rows = self.num_perm // self.bands
+        for band in range(self.bands):
+            buckets = {}
+            for i, sig in enumerate(signatures):
+                if sig is None:
+                    continue
+                key = sig[band * rows:(band + 1) * rows].tobytes()
+                first = buckets.setdefault(key, i)
+                # Compare with the bucket's first member only; union-find links the rest
+                if first != i and find(first) != find(i):
+                    if np.mean(signatures[first] == sig) >= self.threshold:
+                        ri, rf = find(i), find(first)
+                        parent[max(ri, rf)] = min(ri, rf)
+
+        return [find(i) for i in range(len(docs))]
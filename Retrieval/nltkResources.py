@@ -0,0 +1,62 @@
+# Resource -> (packages to download, data paths any one of which satisfies it).
+# Newer NLTK releases read Punkt from punkt_tab, older ones from punkt.
+RESOURCES = {
+    "punkt": (("punkt_tab", "punkt"), ("tokenizers/punkt_tab/english/", "tokenizers/punkt/english.pickle")),
+    "stopwords": (("stopwords",), ("corpora/stopwords/english",)),
+}
+
+_verified = set()
+
+
+def _present(paths):
+    import nltk
+    for path in paths:
+        try:
+            nltk.data.find(path)
+            return True
+        except LookupError:
+            continue
+    return False
+
+
+def ensureNltkData(*names, download=False):
+    """
+    Check that NLTK data is available locally, without touching the network
+
+    Parameters
+    ----------
+    arg1 : str
+        Names of entries of RESOURCES
+    download : bool
+        Download missing resources instead of failing
+
+    Raises
+    ------
+    LookupError
+        If a resource is missing and download is False
+    """
+
+    missing = [n for n in names if n not in _verified and not _present(RESOURCES[n][1])]
+    _verified.update(n for n in names if n not in missing)
+    if not missing:
+        return
+
+    if download:
+        import nltk
+        for name in missing:
+            for package in RESOURCES[name][0]:
+                nltk.download(package, quiet=True)
+        ensureNltkData(*missing)
+        return
+
+    raise LookupError(
+        f"NLTK data not found locally: {', '.join(missing)}. Run "
+        f"`python Retrieval/nltkResources.py` once on a machine with network "
+        f"access (and copy its nltk_data folder to offline servers)."
+    )
+
+
+if __name__ == "__main__":
+    # One-time bootstrap: download whatever is missing
+    ensureNltkData(*RESOURCES, download=True)
+    print("NLTK data ready: " + ", ".join(RESOURCES))
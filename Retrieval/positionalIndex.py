@@ -0,0 +1,150 @@
+import numpy as np
+
+
+class PositionalIndex():
+    """
+    Positional inverted index over the tokenized corpus.
+
+    Postings are kept in three flat arrays instead of per-term Python
+    lists: for term ``t`` the documents containing it are
+    ``post_docs[term_ptr[t]:term_ptr[t+1]]`` and the positions of ``t`` in
+    the ``j``-th of those documents are the cumulative sum of
+    ``positions[post_ptr[j]:post_ptr[j+1]]`` (positions are delta-encoded).
+    """
+
+    def __init__(self):
+        self.term_ids = {}
+        self.term_ptr = None
+        self.post_docs = None
+        self.post_ptr = None
+        self.positions = None
+
+    def build(self, tokenized_corpus):
+        """
+        Build the index
+
+        Parameters
+        ----------
+        arg1 : list
+            A list of lists where the ith sub-list is the sequence of tokens
+            of the ith document
+        """
+
+        term_col, doc_col, pos_col = [], [], []
+        for doc_idx, tokens in enumerate(tokenized_corpus):
+            ids = [self.term_ids.setdefault(tok, len(self.term_ids)) for tok in tokens]
+            term_col.append(np.asarray(ids, dtype=np.int32))
+            doc_col.append(np.full(len(ids), doc_idx, dtype=np.int32))
+            pos_col.append(np.arange(len(ids), dtype=np.int32))
+
+        terms = np.concatenate(term_col) if term_col else np.zeros(0, dtype=np.int32)
+        docs = np.concatenate(doc_col) if doc_col else np.zeros(0, dtype=np.int32)
+        pos = np.concatenate(pos_col) if pos_col else np.zeros(0, dtype=np.int32)
+
+        # Sort occurrences by (term, doc, position)
+        order = np.lexsort((pos, docs, terms))
+        terms, docs, pos = terms[order], docs[order], pos[order]
+
+        # One posting per distinct (term, doc) pair
+        new_posting = np.ones(len(terms), dtype=bool)
+        new_posting[1:] = (terms[1:] != terms[:-1]) | (docs[1:] != docs[:-1])
+        starts = np.flatnonzero(new_posting)
+
+        self.post_docs = docs[starts]
+        self.post_ptr = np.append(starts, len(terms)).astype(np.int64)
+        self.term_ptr = np.searchsorted(
+            terms[starts], np.arange(len(self.term_ids) + 1)
+        ).astype(np.int64)
+
+        deltas = np.diff(pos, prepend=0)
+        deltas[starts] = pos[starts]
+        dtype = np.uint16 if len(deltas) == 0 or deltas.max() < 2**16 else np.uint32
+        self.positions = deltas.astype(dtype)
+
+    def _postings(self, term):
+        t = self.term_ids.get(term)
+        if t is None:
+            return None, None
+        lo, hi = self.term_ptr[t], self.term_ptr[t + 1]
+        return self.post_docs[lo:hi], lo
+
+    def _positions(self, posting):
+        lo, hi = self.post_ptr[posting], self.post_ptr[posting + 1]
+        return np.cumsum(self.positions[lo:hi], dtype=np.int64)
+
+    def match(self, terms, slop=None):
+        """
+        Find the documents matching a phrase or a proximity query
+
+        Parameters
+        ----------
+        arg1 : list
+            The query terms, in order
+        arg2 : int or None
+            None for an exact phrase match; otherwise the number of extra
+            tokens allowed in the window spanning all the terms (in any order)
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted indices of the matching documents
+        """
+
+        terms = list(terms)
+        if not terms:
+            return np.zeros(0, dtype=np.int32)
+
+        postings = []
+        for term in terms:
+            docs, base = self._postings(term)
+            if docs is None:
+                return np.zeros(0, dtype=np.int32)
+            postings.append((docs, base))
+
+        # Intersect the doc lists, shortest first
+        candidates = min(postings, key=lambda p: len(p[0]))[0]
+        for docs, _ in sorted(postings, key=lambda p: len(p[0])):
+            candidates = np.intersect1d(candidates, docs, assume_unique=True)
+            if len(candidates) == 0:
+                return candidates
+
+        slots = [base + np.searchsorted(docs, candidates) for docs, base in postings]
+        matched = []
+        for j, doc in enumerate(candidates):
+            positions = [self._positions(slot[j]) for slot in slots]
+            if slop is None:
+                if self._adjacent(positions):
+                    matched.append(doc)
+            elif self._within(positions, len(terms) - 1 + slop):
+                matched.append(doc)
+        return np.asarray(matched, dtype=np.int32)
+
+    def _adjacent(self, positions):
+        starts = positions[0]
+        for offset, pos in enumerate(positions[1:], 1):
+            starts = np.intersect1d(starts, pos - offset, assume_unique=True)
+            if len(starts) == 0:
+                return False
+        return True
+
+    def _within(self, positions, span):
+        # Smallest window covering one occurrence of every term
+        merged = np.concatenate(positions)
+        labels = np.concatenate([np.full(len(p), i) for i, p in enumerate(positions)])
+        order = np.argsort(merged, kind="stable")
+        merged, labels = merged[order], labels[order]
+
+        counts = np.zeros(len(positions), dtype=np.int64)
+        covered, left = 0, 0
+        for right in range(len(merged)):
+            if counts[labels[right]] == 0:
+                covered += 1
+            counts[labels[right]] += 1
+            while covered == len(positions):
+                if merged[right] - merged[left] <= span:
+                    return True
+                counts[labels[left]] -= 1
+                if counts[labels[left]] == 0:
+                    covered -= 1
+                left += 1
+        return False
@@ -0,0 +1,69 @@
+import os
+import threading
+from collections import Counter, OrderedDict
+
+
+class LRUCache():
+    """
+    Thread-safe least-recently-used cache.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class QueryLog():
+    """
+    Append-only log of normalized queries, one "top_k<TAB>query" per line,
+    used to find the most frequent queries to replay at startup.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, query, top_k):
+        query = normalize_query(query)
+        if not query:
+            return
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{top_k}\t{query}\n")
+
+    def most_frequent(self, n):
+        """
+        The n most frequent (query, top_k) pairs in the log
+        """
+
+        if not os.path.exists(self.path):
+            return []
+        counts = Counter()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                top_k, _, query = line.rstrip("\n").partition("\t")
+                if query and top_k.isdigit():
+                    counts[(query, int(top_k))] += 1
+        return [entry for entry, _ in counts.most_common(n)]
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import hashlib
+
+
+def fingerprint(path):
+    """
+    SHA-1 of a file's contents
+    """
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_hash(config):
+    """
+    Short SHA-1 of a JSON-serializable configuration
+    """
+
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def source_fingerprint(folder):
+    """
+    SHA-1 over the Python sources of a folder, so that cached runs are not
+    reused after the retrieval code changes
+    """
+
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.py'):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(folder, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class RunCache():
+    """
+    TREC-format run files ("qid Q0 docid rank score tag") named by a hash
+    of the configuration that produced them, each with a JSON sidecar
+    holding that configuration and the retrieval latency.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def key(self, config):
+        return config_hash(config)
+
+    def path(self, key, suffix=".run"):
+        return os.path.join(self.folder, key + suffix)
+
+    def load(self, key):
+        """
+        The cached ({query ID: ranked doc IDs}, metadata) of a key, or None
+        """
+
+        if not (os.path.exists(self.path(key)) and os.path.exists(self.path(key, ".json"))):
+            return None
+        run = {}
+        with open(self.path(key), 'r', encoding='utf-8') as f:
+            for line in f:
+                qid, _, doc_id, _, _, _ = line.split()
+                run.setdefault(qid, []).append(doc_id)
+        with open(self.path(key, ".json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Queries that retrieved nothing have no lines in the run file
+        for qid in meta.get("query_ids", []):
+            run.setdefault(qid, [])
+        return run, meta
+
+    def save(self, key, run, meta, tag="main_3"):
+        """
+        Parameters
+        ----------
+        arg1 : str
+            The configuration hash
+        arg2 : dict
+            {query ID: doc IDs in ranked order}
+        arg3 : dict
+            Metadata stored next to the run
+        """
+
+        os.makedirs(self.folder, exist_ok=True)
+        # Only the order is known, so the score is the reversed rank
+        with open(self.path(key), 'w', encoding='utf-8') as f:
+            for qid, doc_ids in run.items():
+                for rank, doc_id in enumerate(doc_ids, 1):
+                    f.write(f"{qid} Q0 {doc_id} {rank} {len(doc_ids) - rank + 1} {tag}\n")
+        meta = dict(meta, query_ids=list(run), created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        with open(self.path(key, ".json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, default=str)
+        return meta
@@ -1,10 +1,7 @@
 # Add your import statements here
 import re
 import json
-import nltk
-from nltk.tokenize import sent_tokenize
-nltk.download('punkt')
-nltk.download('punkt_tab')
+from nltkResources import ensureNltkData
 
 class SentenceSegmentation():
 
@@ -48,5 +45,7 @@ class SentenceSegmentation():
 
 		#Fill in code here
 		# Performing sentence segmentation using the Punkt Tokenizer
+		ensureNltkData("punkt")
+		from nltk.tokenize import sent_tokenize
 		segmentedText = sent_tokenize(text)
 		return segmentedText
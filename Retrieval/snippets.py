@@ -0,0 +1,98 @@
+import numpy as np
+
+
+class SnippetIndex():
+    """
+    Character offsets of the (stemmed, stopword-free) tokens of every
+    abstract, captured during preprocessing so that snippets can be cut and
+    highlighted at query time without re-tokenizing the results.
+    """
+
+    def __init__(self):
+        self.term_ids = {}
+        self.doc_ptr = None
+        self.terms = None
+        self.starts = None
+        self.lengths = None
+
+    def build(self, doc_spans):
+        """
+        Build the index
+
+        Parameters
+        ----------
+        arg1 : list
+            A list where the ith element is the list of (start, end, term)
+            tuples of the ith abstract
+        """
+
+        terms, starts, lengths, doc_ptr = [], [], [], [0]
+        for spans in doc_spans:
+            for start, end, term in spans:
+                terms.append(self.term_ids.setdefault(term, len(self.term_ids)))
+                starts.append(start)
+                lengths.append(end - start)
+            doc_ptr.append(len(terms))
+
+        self.doc_ptr = np.asarray(doc_ptr, dtype=np.int64)
+        self.terms = np.asarray(terms, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.uint32 if starts and max(starts) >= 2**16 else np.uint16)
+        self.lengths = np.asarray(lengths, dtype=np.uint16 if lengths and max(lengths) >= 2**8 else np.uint8)
+
+    def snippet(self, doc_idx, text, query_terms, window=40, max_chars=500, highlight=("**", "**")):
+        """
+        Best matching passage of a document, with the query terms highlighted
+
+        Parameters
+        ----------
+        arg1 : int
+            The document index
+        arg2 : str
+            The abstract the offsets refer to
+        arg3 : iterable
+            The (stemmed) query and expansion terms
+        arg4 : int
+            The passage length, in tokens
+
+        Returns
+        -------
+        str
+            The passage containing the most distinct query terms (the
+            beginning of the text if none occurs)
+        """
+
+        lo, hi = self.doc_ptr[doc_idx], self.doc_ptr[doc_idx + 1]
+        query_ids = [self.term_ids[t] for t in query_terms if t in self.term_ids]
+        terms = self.terms[lo:hi]
+        matches = np.flatnonzero(np.isin(terms, query_ids)) if query_ids else np.zeros(0, dtype=np.int64)
+        if len(matches) == 0:
+            return text[:max_chars] + ("..." if len(text) > max_chars else "")
+
+        # Window starting at a match that covers the most distinct terms, then the most matches
+        best, best_key = matches[0], None
+        for i, first in enumerate(matches):
+            inside = matches[i:np.searchsorted(matches, first + window)]
+            key = (len(set(terms[inside].tolist())), len(inside))
+            if best_key is None or key > best_key:
+                best, best_key = first, key
+
+        first = max(best - 3, 0)
+        last = min(best + window, hi - lo) - 1
+        starts = self.starts[lo:hi].astype(np.int64)
+        ends = starts + self.lengths[lo:hi]
+        begin, end = int(starts[first]) if first > 0 else 0, int(ends[last])
+        if end - begin > max_chars:
+            end = begin + max_chars
+
+        pieces = ["..." if begin > 0 else ""]
+        cursor = begin
+        for m in matches[(matches >= first) & (matches <= last)]:
+            s, e = int(starts[m]), int(ends[m])
+            if e > end:
+                break
+            pieces += [text[cursor:s], highlight[0], text[s:e], highlight[1]]
+            cursor = e
+        pieces.append(text[cursor:end])
+        if end < len(text):
+            pieces.append("...")
+        return "".join(pieces)
@@ -0,0 +1,131 @@
+import re
+
+QUERY_WORD_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9]+')
+
+
+class SpellCorrector():
+    """
+    Symmetric delete spelling correction: every dictionary term is indexed
+    under all the strings obtained by deleting up to max_distance characters
+    from its prefix, so the candidates for a query word are found by
+    generating the deletes of the word and looking them up, instead of
+    computing edit distances against the whole vocabulary.
+    """
+
+    def __init__(self, max_distance=2, prefix_length=7, min_df=2, min_length=4):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_df = min_df
+        self.min_length = min_length
+        self.term_df = {}
+        self.terms = []
+        self.deletes = {}
+
+    def build(self, term_df):
+        """
+        Build the delete index
+
+        Parameters
+        ----------
+        arg1 : dict
+            Maps each (lowercased) corpus term to its document frequency.
+            Terms below min_df are known words but never suggested.
+        """
+
+        self.term_df = term_df
+        self.terms = [t for t, df in term_df.items() if df >= self.min_df]
+        self.deletes = {}
+        for term_id, term in enumerate(self.terms):
+            for variant in edits(term[:self.prefix_length], self.max_distance):
+                self.deletes.setdefault(variant, []).append(term_id)
+
+    def correct(self, word):
+        """
+        Best correction of a single lowercased word
+
+        Returns
+        -------
+        str or None
+            The most frequent dictionary term at the smallest edit distance,
+            or None if the word is known, too short or has no candidate
+        """
+
+        if word in self.term_df or len(word) < self.min_length:
+            return None
+        max_distance = 1 if len(word) <= 5 else self.max_distance
+
+        best, best_key = None, None
+        seen = set()
+        for variant in edits(word[:self.prefix_length], max_distance):
+            for term_id in self.deletes.get(variant, ()):
+                if term_id in seen:
+                    continue
+                seen.add(term_id)
+                term = self.terms[term_id]
+                if abs(len(term) - len(word)) > max_distance:
+                    continue
+                distance = edit_distance(word, term, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.term_df[term])
+                if best_key is None or key < best_key:
+                    best, best_key = term, key
+        return best
+
+    def correct_query(self, query):
+        """
+        Correct every unknown word of a query string
+
+        Returns
+        -------
+        tuple
+            The corrected query and a dict mapping each corrected word to
+            its replacement
+        """
+
+        corrections = {}
+
+        def replace(match):
+            word = match.group(0)
+            fixed = self.correct(word.lower())
+            if fixed is None:
+                return word
+            corrections[word] = fixed
+            return fixed
+
+        return QUERY_WORD_PATTERN.sub(replace, query), corrections
+
+
+def edits(word, max_distance):
+    """
+    The word and every string obtained by deleting up to max_distance of its
+    characters
+    """
+
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent
+    transpositions), giving up once it exceeds max_distance
+    """
+
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
@@ -1,15 +1,15 @@
 # Add your import statements here
 import json 
-import nltk
-nltk.download('punkt')
-nltk.download('punkt_tab')
-from nltk.corpus import stopwords
+from functools import lru_cache
+from nltkResources import ensureNltkData
 
-# Download stopwords
-nltk.download('stopwords')
 
-# Load the set of stop words
-stop_words = set(stopwords.words('english'))
+@lru_cache(maxsize=None)
+def englishStopwords():
+    # Load the set of stop words on first use
+    ensureNltkData("stopwords")
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
 
 class StopwordRemoval():
     def fromList(self, text):
@@ -29,6 +29,7 @@ class StopwordRemoval():
             representing a sentence with stopwords removed
         """
 
+        stop_words = englishStopwords()
         stopwordsRemovedText = [[word for word in sentence if word.lower() not in stop_words] for sentence in text]
         return stopwordsRemovedText
 
@@ -1,10 +1,6 @@
 # Add your import statements here
 import re
 import json
-import nltk
-from nltk.tokenize import word_tokenize, TreebankWordTokenizer
-nltk.download('punkt')
-nltk.download('punkt_tab')
 class Tokenization():
     def naive(self, text):
         """
@@ -41,6 +37,7 @@ class Tokenization():
         """
 
         # Initializing Penn Treebank Tokenizer
+        from nltk.tokenize import TreebankWordTokenizer
         treebank_tokenizer = TreebankWordTokenizer()
 
 		# Perform word tokenization using the Penn Treebank Tokenizer
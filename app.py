@@ -1,9 +1,6 @@
 import streamlit as st
 import sys
 import os
-import nltk
-nltk.download('punkt')
-nltk.download('punkt_tab')
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'Retrieval'))
 from Retrieval.main_3 import SearchEngine
@@ -27,10 +24,91 @@ def load_search_engine():
             self.grid_search     = False
             self.use_dpr         = False
             self.dpr_top_k       = 20
+            self.candidate_k     = 1000
+            self.query_deadline  = 2.0
+            self.query_log       = True
+            self.warm_queries    = 100
             self.max_papers      = 10000
+            self.positional_index = True
+            self.spell_correction = True
+            self.snippets        = True
+            self.knn_k           = 20
+            self.hot_fraction    = 0.2
+            self.hot_min_score   = 0.2
 
     return SearchEngine(Args())
 
+def show_similar(paper):
+    st.session_state["similar_to"] = (paper["id"], paper["title"])
+
+def render_similar(search_engine):
+    paper_id, title = st.session_state["similar_to"]
+    st.subheader(f"Papers similar to: '{title}'")
+    for i, paper in enumerate(search_engine.similar_papers(paper_id, k=10), 1):
+        st.markdown(
+            f"{i}. [{paper['title']}](https://arxiv.org/abs/{paper['id']}) "
+            f"— similarity {paper['similarity']:.2f}"
+        )
+    if st.button("Close similar papers"):
+        del st.session_state["similar_to"]
+        st.rerun()
+
+def render_results(res, query, reranking=False, render=0):
+    st.success(f"Found {len(res)} relevant papers")
+    if reranking:
+        st.caption("Re-ranking with DPR...")
+    if res.tier == "hot":
+        st.caption("Showing recent papers; tick *All years* to search the archive too.")
+    if res.degraded:
+        st.caption("Skipped to answer quickly: " + ", ".join(res.degraded))
+    if res.corrections:
+        st.info("Corrected: " + ", ".join(f"*{w}* → **{c}**" for w, c in res.corrections.items()))
+    st.subheader(f"Search results for: '{query}'")
+
+    if not res:
+        st.info("No papers found matching your query. Try different keywords.")
+        return
+
+    facet_cols = st.columns(len(res.facets))
+    for col, (name, counts) in zip(facet_cols, res.facets.items()):
+        with col:
+            st.caption(f"**{name.title()}:** " + ", ".join(f"{v} ({c})" for v, c in counts[:5]))
+
+    for i, paper in enumerate(res, 1):
+        with st.expander(f"**{i}. {paper['title']}**", expanded=(i <= 3)):
+            info_col, link_col = st.columns([3, 1])
+
+            with info_col:
+                st.write("**Abstract:**")
+                abstract = paper.get('snippet') or paper.get('abstract', 'No abstract available')
+                if 'snippet' not in paper and len(abstract) > 500:
+                    abstract = abstract[:500] + "..."
+                st.write(abstract)
+
+                if paper.get('authors'):
+                    st.write("**Authors:**")
+                    st.write(", ".join(paper['authors'][:5]))
+                    if len(paper['authors']) > 5:
+                        st.write(f"... and {len(paper['authors']) - 5} more")
+
+                if paper.get('categories'):
+                    st.write("**Categories:**")
+                    st.write(", ".join(paper['categories'][:5]))
+
+            with link_col:
+                pid = paper['id']
+                arxiv_url = f"https://arxiv.org/abs/{pid}"
+                pdf_url   = f"https://arxiv.org/pdf/{pid}.pdf"
+
+                st.markdown(f"**Paper ID:** {pid}")
+                st.markdown(f"[📄 View on ArXiv]({arxiv_url})")
+                st.markdown(f"[📁 Download PDF]({pdf_url})")
+                st.code(f"arXiv:{pid}", language="text")
+                st.button(
+                    "Similar papers", key=f"similar-{render}-{pid}",
+                    on_click=show_similar, args=(paper,)
+                )
+
 def main():
     st.title("Research Paper Search Engine")
     st.markdown("Search for relevant research papers")
@@ -47,6 +125,8 @@ def main():
         arxiv_docs_path = os.path.join("dataset", "arXiv", "arxiv-metadata-oai-snapshot.json")
         if os.path.exists(arxiv_docs_path):
             st.success("✅ ArXiv data processed and ready")
+            if not load_search_engine().ready.is_set():
+                st.info("⏳ Warming caches with frequent queries")
         else:
             st.warning("⚠️ ArXiv data will be processed on first search")
 
@@ -57,11 +137,36 @@ def main():
             "Enter your search query:",
             placeholder="e.g., neural networks, transformer models, computer vision"
         )
+        st.caption('Use "quotes" for exact phrases and "terms"~N for terms within N words of each other.')
     with col2:
         top_k = st.selectbox("Results:",[5,10,15,20],index=0)
 
     search_engine = load_search_engine()
 
+    if query and query.strip():
+        suggestions = search_engine.suggest(query)
+        completions = [q for q, _ in suggestions["queries"] if q != " ".join(query.lower().split())]
+        completions += [t for t, _ in suggestions["titles"]]
+        if completions:
+            st.caption("Suggestions: " + " · ".join(completions[:5]))
+
+    if "similar_to" in st.session_state:
+        render_similar(search_engine)
+
+    with st.expander("Filters"):
+        facet_index = search_engine.facetIndex
+        category_df = facet_index.facets["categories"].doc_frequency()
+        categories = st.multiselect(
+            "Categories:", sorted(category_df, key=category_df.get, reverse=True)
+        )
+        authors = st.multiselect("Authors:", sorted(facet_index.values("authors")))
+        years = sorted(facet_index.values("year"))
+        all_years = st.checkbox("All years", help="Also search older papers even when recent ones match well")
+        year_range = st.slider("Submission year:", years[0], years[-1], (years[0], years[-1])) if len(years) > 1 else None
+    filters = {"categories": categories, "authors": authors}
+    if year_range and year_range != (years[0], years[-1]):
+        filters["year"] = year_range
+
     if st.button("🔍 Search Papers", type="primary", use_container_width=True):
         if not query or not query.strip():
             st.warning("Please enter a search query.")
@@ -69,44 +174,15 @@ def main():
 
         with st.spinner("Searching for relevant papers... This may take a moment for the first search."):
             try:
-                res = search_engine.search_papers(query, top_k=top_k)
-                st.success(f"Found {len(res)} relevant papers")
-                st.subheader(f"Search results for: '{query}'")
-
-                if not res:
-                    st.info("No papers found matching your query. Try different keywords.")
-                    return
-
-                for i, paper in enumerate(res, 1):
-                    with st.expander(f"**{i}. {paper['title']}**", expanded=(i <= 3)):
-                        info_col, link_col = st.columns([3, 1])
-
-                        with info_col:
-                            st.write("**Abstract:**")
-                            abstract = paper.get('abstract', 'No abstract available')
-                            if len(abstract) > 500:
-                                abstract = abstract[:500] + "..."
-                            st.write(abstract)
-
-                            if paper.get('authors'):
-                                st.write("**Authors:**")
-                                st.write(", ".join(paper['authors'][:5]))
-                                if len(paper['authors']) > 5:
-                                    st.write(f"... and {len(paper['authors']) - 5} more")
-
-                            if paper.get('categories'):
-                                st.write("**Categories:**")
-                                st.write(", ".join(paper['categories'][:5]))
-
-                        with link_col:
-                            pid = paper['id']
-                            arxiv_url = f"https://arxiv.org/abs/{pid}"
-                            pdf_url   = f"https://arxiv.org/pdf/{pid}.pdf"
-
-                            st.markdown(f"**Paper ID:** {pid}")
-                            st.markdown(f"[📄 View on ArXiv]({arxiv_url})")
-                            st.markdown(f"[📁 Download PDF]({pdf_url})")
-                            st.code(f"arXiv:{pid}", language="text")
+                results_area = st.empty()
+                for render, res in enumerate(search_engine.search_papers_stream(
+                    query, top_k=top_k, filters=filters, deadline=search_engine.args.query_deadline,
+                    all_years=all_years
+                )):
+                    with results_area.container():
+                        render_results(res, query, reranking=(
+                            res.stage == "lexical" and search_engine.args.use_dpr and "dpr" not in res.degraded
+                        ), render=render)
 
             except Exception as e:
                 st.error(f"Error during search: {e}")